@@ -1,28 +1,344 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import monitoring, ASCENDING, DESCENDING, TEXT, ReadPreference, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from bson import ObjectId
 import os
+import json
+import time
+import importlib
+import socket
+import threading
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import uuid
+import asyncio
+import calendar
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
 from datetime import datetime, timezone, timedelta
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 
+class LazyModule:
+    """Stand-in for a heavy module, imported on first attribute access.
+
+    numpy/pandas/pyarrow only serve analytics and exports, so they stay out of
+    the import path; the startup warm-up loads them once the worker is serving.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def load(self):
+        return importlib.import_module(self._name)
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+pa = LazyModule("pyarrow")
+pq = LazyModule("pyarrow.parquet")
+redis_asyncio = LazyModule("redis.asyncio")  # only with CACHE_URL set
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Per-server connection pool counters, including how long checkouts wait.
+
+    pymongo runs a checkout on a single thread from start to finish, so the
+    start time is kept thread-local until the matching checked-out/failed event.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.servers = {}
+
+    def _server(self, address) -> dict:
+        key = "%s:%s" % address
+        if key not in self.servers:
+            self.servers[key] = {
+                "connections_open": 0,
+                "checkouts": 0,
+                "checkout_failures": {},
+                "in_use": 0,
+                "max_in_use": 0,
+                "wait_time_total_ms": 0.0,
+                "wait_time_max_ms": 0.0,
+                "pool_clears": 0,
+            }
+        return self.servers[key]
+
+    def _waited_ms(self) -> float:
+        started = getattr(self._local, "checkout_started", None)
+        self._local.checkout_started = None
+        return (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            servers = {}
+            for address, stats in self.servers.items():
+                servers[address] = {
+                    **stats,
+                    "checkout_failures": dict(stats["checkout_failures"]),
+                    "wait_time_avg_ms": stats["wait_time_total_ms"] / stats["checkouts"] if stats["checkouts"] else 0.0,
+                }
+            return servers
+
+    def pool_created(self, event):
+        with self._lock:
+            self._server(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._server(event.address)["pool_clears"] += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self._server(event.address)["connections_open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._server(event.address)["connections_open"] -= 1
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = self._waited_ms()
+        with self._lock:
+            stats = self._server(event.address)
+            stats["checkouts"] += 1
+            stats["in_use"] += 1
+            stats["max_in_use"] = max(stats["max_in_use"], stats["in_use"])
+            stats["wait_time_total_ms"] += waited
+            stats["wait_time_max_ms"] = max(stats["wait_time_max_ms"], waited)
+
+    def connection_check_out_failed(self, event):
+        waited = self._waited_ms()
+        with self._lock:
+            stats = self._server(event.address)
+            stats["checkout_failures"][event.reason] = stats["checkout_failures"].get(event.reason, 0) + 1
+            stats["wait_time_max_ms"] = max(stats["wait_time_max_ms"], waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._server(event.address)["in_use"] -= 1
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+# Unset values keep the driver defaults
+MONGO_POOL_OPTIONS = {
+    option: int(os.environ[name])
+    for name, option in (
+        ('MONGO_MAX_POOL_SIZE', 'maxPoolSize'),
+        ('MONGO_MIN_POOL_SIZE', 'minPoolSize'),
+        ('MONGO_MAX_IDLE_TIME_MS', 'maxIdleTimeMS'),
+        ('MONGO_WAIT_QUEUE_TIMEOUT_MS', 'waitQueueTimeoutMS'),
+        ('MONGO_CONNECT_TIMEOUT_MS', 'connectTimeoutMS'),
+        ('MONGO_SOCKET_TIMEOUT_MS', 'socketTimeoutMS'),
+        ('MONGO_SERVER_SELECTION_TIMEOUT_MS', 'serverSelectionTimeoutMS'),
+    )
+    if os.environ.get(name)
+}
+MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', '')  # e.g. "zstd,snappy,zlib"; empty disables
+MONGO_READ_PREFERENCE = os.environ.get('MONGO_READ_PREFERENCE', 'primary')
+# Owner-facing comparison and anomaly reads (the cached dashboard always uses the primary); opt in to secondaries
+# only if owners may briefly miss their own latest edits
+MONGO_ANALYTICS_READ_PREFERENCE = os.environ.get('MONGO_ANALYTICS_READ_PREFERENCE', 'primary')
+# Admin portfolio analytics, where replication lag doesn't matter
+MONGO_PORTFOLIO_READ_PREFERENCE = os.environ.get('MONGO_PORTFOLIO_READ_PREFERENCE', 'secondaryPreferred')
+
 # MongoDB connection
+pool_metrics = PoolMetrics()
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client_options = dict(MONGO_POOL_OPTIONS, event_listeners=[pool_metrics])
+if MONGO_COMPRESSORS:
+    client_options["compressors"] = MONGO_COMPRESSORS
+client = AsyncIOMotorClient(mongo_url, read_preference=READ_PREFERENCES[MONGO_READ_PREFERENCE], **client_options)
 db = client[os.environ['DB_NAME']]
+analytics_db = client.get_database(
+    os.environ['DB_NAME'], read_preference=READ_PREFERENCES[MONGO_ANALYTICS_READ_PREFERENCE]
+)
+portfolio_db = client.get_database(
+    os.environ['DB_NAME'], read_preference=READ_PREFERENCES[MONGO_PORTFOLIO_READ_PREFERENCE]
+)
+
+# Shared cache
+# Hot per-user reads (profile, dashboard, autocomplete) are cached in one
+# namespace per user, dropped whenever that user's flats, tenants or expenses
+# change. Authorization checks such as flat ownership always go to Mongo. With
+# CACHE_URL set the entries live in Redis, so every uvicorn worker sees the same
+# data; workers also keep a short-lived local copy, which an invalidation
+# published on CACHE_INVALIDATION_CHANNEL evicts everywhere. Without CACHE_URL
+# and with several workers, nothing invalidates the other workers' copies, so
+# entries are kept no longer than CACHE_LOCAL_TTL_SECONDS.
+CACHE_URL = os.environ.get('CACHE_URL', '')  # e.g. redis://localhost:6379/0; empty keeps it in-process
+CACHE_TTL_SECONDS = int(os.environ.get('CACHE_TTL_SECONDS', '60'))
+CACHE_LOCAL_TTL_SECONDS = float(os.environ.get('CACHE_LOCAL_TTL_SECONDS', '5'))
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '1'))  # uvicorn/gunicorn worker count
+CACHE_INVALIDATION_CHANNEL = "cache-invalidate"
+
+class MemoryCache:
+    """Process-local backend: namespace -> {key: (expires_at, value)}.
+
+    Expired entries are dropped when read, and swept from every namespace at
+    most once per SWEEP_SECONDS on write, so keys nobody reads again (an old
+    data_version, a one-off date range) don't pile up.
+    """
+
+    SWEEP_SECONDS = 60
+
+    def __init__(self, max_ttl: Optional[float] = None):
+        self.entries = {}
+        self.max_ttl = max_ttl
+        self.swept_at = time.monotonic()
+
+    async def get(self, namespace: str, key: str) -> Any:
+        entries = self.entries.get(namespace, {})
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del entries[key]
+            if not entries:
+                self.entries.pop(namespace, None)
+            return None
+        return entry[1]
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float):
+        if self.max_ttl is not None:
+            ttl = min(ttl, self.max_ttl)
+        now = time.monotonic()
+        if now - self.swept_at >= self.SWEEP_SECONDS:
+            self.sweep(now)
+        self.entries.setdefault(namespace, {})[key] = (now + ttl, value)
+
+    def sweep(self, now: float):
+        for namespace in list(self.entries):
+            live = {key: entry for key, entry in self.entries[namespace].items() if entry[0] > now}
+            if live:
+                self.entries[namespace] = live
+            else:
+                del self.entries[namespace]
+        self.swept_at = now
+
+    async def invalidate(self, namespace: str):
+        self.entries.pop(namespace, None)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+class RedisCache:
+    """Backend shared by all workers through a Redis-protocol server.
+
+    Each namespace is one hash, so invalidating a user is a single DEL. Values
+    are stored as JSON alongside their own expiry. Redis errors degrade to cache
+    misses; entries that missed an invalidation still expire after their TTL.
+    """
+
+    def __init__(self, redis, local_ttl: float):
+        self.redis = redis
+        self.local = MemoryCache()
+        self.local_ttl = local_ttl
+        self._listener = None
+
+    async def get(self, namespace: str, key: str) -> Any:
+        value = await self.local.get(namespace, key)
+        if value is not None:
+            return value
+        try:
+            raw = await self.redis.hget(namespace, key)
+        except redis_asyncio.RedisError:
+            logger.warning("Cache read failed for %s", namespace, exc_info=True)
+            return None
+        if raw is None:
+            return None
+        expires_at, value = json.loads(raw)
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            return None
+        await self.local.set(namespace, key, value, min(self.local_ttl, remaining))
+        return value
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float):
+        await self.local.set(namespace, key, value, min(self.local_ttl, ttl))
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(namespace, key, json.dumps([time.time() + ttl, value]))
+        pipe.expire(namespace, max(1, int(ttl)))
+        try:
+            await pipe.execute()
+        except redis_asyncio.RedisError:
+            logger.warning("Cache write failed for %s", namespace, exc_info=True)
+
+    async def invalidate(self, namespace: str):
+        await self.local.invalidate(namespace)
+        try:
+            await self.redis.delete(namespace)
+            await self.redis.publish(CACHE_INVALIDATION_CHANNEL, namespace)
+        except redis_asyncio.RedisError:
+            logger.warning("Cache invalidation failed for %s", namespace, exc_info=True)
+
+    async def listen(self):
+        """Evict local copies as other workers publish invalidations."""
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            await self.local.invalidate(message["data"])
+            except redis_asyncio.RedisError:
+                logger.warning("Cache invalidation channel lost, reconnecting", exc_info=True)
+            # Invalidations sent while disconnected are gone; start the local copy over
+            self.local.entries.clear()
+            await asyncio.sleep(1)
+
+    async def start(self):
+        self._listener = asyncio.create_task(self.listen())
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        await self.redis.aclose()
+
+def create_cache():
+    if not CACHE_URL:
+        return MemoryCache(max_ttl=CACHE_LOCAL_TTL_SECONDS if WEB_CONCURRENCY > 1 else None)
+    return RedisCache(redis_asyncio.from_url(CACHE_URL, decode_responses=True), CACHE_LOCAL_TTL_SECONDS)
+
+def user_cache_namespace(user_id: str) -> str:
+    return f"user:{user_id}"
+
+cache = create_cache()
 
-# Create the main app
-app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
 # Security
@@ -101,6 +417,38 @@ class ExpenseCreate(BaseModel):
     flat_id: str
     date: Optional[datetime] = None
 
+class RecurringExpense(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    category: str
+    description: str
+    amount: float
+    flat_id: str
+    user_id: str
+    cadence: str  # weekly, monthly, quarterly, yearly
+    start_date: datetime
+    end_date: Optional[datetime] = None
+    next_date: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class RecurringExpenseCreate(BaseModel):
+    category: str
+    description: str
+    amount: float
+    flat_id: str
+    cadence: str
+    start_date: datetime
+    end_date: Optional[datetime] = None
+
+class ExpenseSearchHit(Expense):
+    score: float
+
+class ExpenseSearchResults(BaseModel):
+    total: int
+    skip: int
+    limit: int
+    results: List[ExpenseSearchHit]
+
 class FlatSummary(BaseModel):
     flat: Flat
     total_income: float
@@ -118,6 +466,144 @@ class DashboardStats(BaseModel):
     average_profit_percentage: float
     flats_summary: List[FlatSummary]
 
+class PeriodTotals(BaseModel):
+    start: datetime
+    end: datetime
+    total_income: float
+    total_expenses: float
+    profit: float
+    profit_percentage: float
+
+class FlatComparison(BaseModel):
+    flat: Flat
+    current: PeriodTotals
+    previous: PeriodTotals
+    expenses_change: float
+    expenses_change_percentage: Optional[float]
+    profit_change: float
+    profit_change_percentage: Optional[float]
+
+class PeriodComparison(BaseModel):
+    period: str
+    baseline: str
+    current: PeriodTotals
+    previous: PeriodTotals
+    expenses_change: float
+    expenses_change_percentage: Optional[float]
+    profit_change: float
+    profit_change_percentage: Optional[float]
+    flats_comparison: List[FlatComparison]
+
+class MonthlyProjection(BaseModel):
+    month: str  # YYYY-MM
+    projected_income: float
+    projected_expenses: float
+    projected_profit: float
+    profit_percentage: float
+
+class FlatForecast(BaseModel):
+    flat: Flat
+    projections: List[MonthlyProjection]
+
+class ProfitForecast(BaseModel):
+    months: int
+    history_months: int
+    seasonal: bool
+    data_version: int
+    projections: List[MonthlyProjection]
+    flats_forecast: List[FlatForecast]
+
+class ExpenseAnomaly(BaseModel):
+    expense: Expense
+    reasons: List[str]  # amount_outlier, duplicate
+    robust_z: Optional[float] = None
+    group_median: Optional[float] = None
+    duplicate_group: Optional[int] = None
+
+class AnomalyReport(BaseModel):
+    threshold: float
+    scanned_at: datetime
+    anomalies: List[ExpenseAnomaly]
+
+class OwnerTotals(BaseModel):
+    user_id: str
+    name: str
+    email: str
+    total_flats: int
+    total_tenants: int
+    total_income: float
+    total_expenses: float
+    total_profit: float
+    profit_percentage: float
+
+class OwnerTotalsPage(BaseModel):
+    owners: List[OwnerTotals]
+    next_cursor: Optional[str]
+
+class FlatProfit(BaseModel):
+    flat: Flat
+    owner_name: str
+    total_income: float
+    total_expenses: float
+    profit: float
+    profit_percentage: float
+
+class CategoryTotal(BaseModel):
+    category: str
+    total_amount: float
+    expense_count: int
+    share_percentage: float
+
+class ServerPoolStats(BaseModel):
+    connections_open: int
+    checkouts: int
+    checkout_failures: Dict[str, int]  # reason -> count
+    in_use: int
+    max_in_use: int
+    wait_time_total_ms: float
+    wait_time_max_ms: float
+    wait_time_avg_ms: float
+    pool_clears: int
+
+class PoolMetricsReport(BaseModel):
+    options: Dict[str, Any]
+    read_preference: str
+    analytics_read_preference: str
+    portfolio_read_preference: str
+    servers: Dict[str, ServerPoolStats]  # "host:port" -> stats
+
+class Tombstone(BaseModel):
+    kind: str  # flat, tenant, expense
+    id: str
+    flat_id: str
+
+class SyncChanges(BaseModel):
+    token: str
+    flats: List[Flat]
+    tenants: List[Tenant]
+    expenses: List[Expense]
+    deleted: List[Tombstone]
+
+class JobCreate(BaseModel):
+    type: str  # dashboard, export_parquet, export_arrow, delete_flat, anomalies
+    params: Dict[str, Any] = {}
+
+class Job(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    type: str
+    params: Dict[str, Any] = {}
+    status: str = "queued"  # queued, running, succeeded, failed
+    progress: float = 0
+    attempts: int = 0
+    result: Optional[Dict[str, Any]] = None
+    result_file: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 # Helper functions
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -132,6 +618,83 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def _as_utc(value) -> datetime:
+    """Parse an ISO string or datetime as an aware UTC datetime; naive values are taken as UTC."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    # Stored dates are compared as ISO strings, so they must all carry the same offset
+    return value.astimezone(timezone.utc)
+
+def build_date_query(start_date: Optional[str], end_date: Optional[str]) -> dict:
+    date_query = {}
+    if start_date:
+        date_query["$gte"] = datetime.fromisoformat(start_date).isoformat()
+    if end_date:
+        date_query["$lte"] = datetime.fromisoformat(end_date).isoformat()
+    return date_query
+
+SYNC_WRITE_TIMEOUT_SECONDS = 300
+
+async def next_sync_seq() -> int:
+    counter = await db.counters.find_one_and_update(
+        {"_id": "sync"}, {"$inc": {"seq": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"]
+
+@asynccontextmanager
+async def sync_write():
+    """Reserve the next sync seq for a flat/tenant/expense write made inside the block.
+
+    Seqs are handed out before their writes commit, possibly out of order. Until
+    the block exits, a marker in `sync_writes` keeps /api/sync tokens at or below
+    the counter value seen before the reservation, so the write can't be skipped.
+    """
+    counter = await db.counters.find_one({"_id": "sync"})
+    marker = await db.sync_writes.insert_one({
+        "floor": counter["seq"] if counter else 0,
+        # A writer that dies holds tokens back only until this passes
+        "expires_at": datetime.now(timezone.utc) + timedelta(seconds=SYNC_WRITE_TIMEOUT_SECONDS),
+    })
+    try:
+        yield await next_sync_seq()
+    finally:
+        await db.sync_writes.delete_one({"_id": marker.inserted_id})
+
+async def write_tombstones(kind: str, collection, match: dict, sync_seq: int):
+    # Built server-side so deleting a large flat doesn't pull its ids into the app
+    await collection.aggregate([
+        {"$match": match},
+        {"$project": {
+            "_id": 0,
+            "kind": {"$literal": kind},
+            "id": 1,
+            "user_id": 1,
+            "flat_id": "$flat_id" if kind != "flat" else "$id",
+            "sync_seq": {"$literal": sync_seq},
+        }},
+        {"$merge": {"into": "tombstones", "whenNotMatched": "insert"}}
+    ]).to_list(None)
+
+async def delete_with_tombstones(kind: str, collection, match: dict, sync_seq: int) -> int:
+    """Tombstone and delete the matching rows, including any inserted meanwhile.
+
+    Rows are marked first, so the tombstones and the delete cover the same set.
+    """
+    token = uuid.uuid4().hex
+    deleted = 0
+    while (await collection.update_many(match, {"$set": {"deleting": token}})).modified_count:
+        marked = {**match, "deleting": token}
+        await write_tombstones(kind, collection, marked, sync_seq)
+        deleted += (await collection.delete_many(marked)).deleted_count
+    return deleted
+
+async def bump_data_version(user_id: str):
+    # Forecasts are cached per user under this counter; everything else in the shared cache
+    await db.users.update_one({"id": user_id}, {"$inc": {"data_version": 1}})
+    await cache.invalidate(user_cache_namespace(user_id))
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -147,15 +710,23 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except JWTError:
         raise credentials_exception
     
-    user_doc = await db.users.find_one({"id": user_id}, {"_id": 0, "hashed_password": 0})
+    user_doc = await cache.get(user_cache_namespace(user_id), "profile")
     if user_doc is None:
-        raise credentials_exception
+        user_doc = await db.users.find_one({"id": user_id}, {"_id": 0, "hashed_password": 0, "data_version": 0})
+        if user_doc is None:
+            raise credentials_exception
+        await cache.set(user_cache_namespace(user_id), "profile", user_doc, CACHE_TTL_SECONDS)
     
     if isinstance(user_doc.get('created_at'), str):
         user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
     
     return User(**user_doc)
 
+async def get_admin_user(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
 # Auth Routes
 @api_router.post("/auth/register", response_model=Token)
 async def register(user_data: UserCreate):
@@ -195,7 +766,10 @@ async def create_flat(flat_data: FlatCreate, current_user: User = Depends(get_cu
     flat = Flat(**flat_data.model_dump(), user_id=current_user.id)
     flat_dict = flat.model_dump()
     flat_dict['created_at'] = flat_dict['created_at'].isoformat()
-    await db.flats.insert_one(flat_dict)
+    async with sync_write() as sync_seq:
+        flat_dict['sync_seq'] = sync_seq
+        await db.flats.insert_one(flat_dict)
+    await bump_data_version(current_user.id)
     return flat
 
 @api_router.get("/flats", response_model=List[Flat])
@@ -217,22 +791,33 @@ async def get_flat(flat_id: str, current_user: User = Depends(get_current_user))
 
 @api_router.put("/flats/{flat_id}", response_model=Flat)
 async def update_flat(flat_id: str, flat_data: FlatCreate, current_user: User = Depends(get_current_user)):
-    result = await db.flats.update_one(
-        {"id": flat_id, "user_id": current_user.id},
-        {"$set": flat_data.model_dump()}
-    )
+    async with sync_write() as sync_seq:
+        result = await db.flats.update_one(
+            {"id": flat_id, "user_id": current_user.id},
+            {"$set": {**flat_data.model_dump(), "sync_seq": sync_seq}}
+        )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Flat not found")
+    await bump_data_version(current_user.id)
     return await get_flat(flat_id, current_user)
 
 @api_router.delete("/flats/{flat_id}")
 async def delete_flat(flat_id: str, current_user: User = Depends(get_current_user)):
-    result = await db.flats.delete_one({"id": flat_id, "user_id": current_user.id})
-    if result.deleted_count == 0:
+    flat_match = {"id": flat_id, "user_id": current_user.id}
+    if not await db.flats.find_one(flat_match, {"_id": 1}):
         raise HTTPException(status_code=404, detail="Flat not found")
-    # Also delete associated tenants and expenses
-    await db.tenants.delete_many({"flat_id": flat_id})
-    await db.expenses.delete_many({"flat_id": flat_id})
+    # Deletes happen inside the block, so no sync token passes the tombstones
+    # while the rows they stand for are still there
+    async with sync_write() as sync_seq:
+        # The flat goes first, so new tenants and expenses can't be added to it
+        if not await delete_with_tombstones("flat", db.flats, flat_match, sync_seq):
+            raise HTTPException(status_code=404, detail="Flat not found")
+        # Also delete associated tenants and expenses
+        for kind, collection in (("tenant", db.tenants), ("expense", db.expenses), ("expense", db.expenses_archive)):
+            await delete_with_tombstones(kind, collection, {"flat_id": flat_id}, sync_seq)
+    await db.expense_archive_summary.delete_many({"flat_id": flat_id})
+    await db.recurring_expenses.delete_many({"flat_id": flat_id})
+    await bump_data_version(current_user.id)
     return {"message": "Flat deleted successfully"}
 
 # Tenant Routes
@@ -246,7 +831,10 @@ async def create_tenant(tenant_data: TenantCreate, current_user: User = Depends(
     tenant = Tenant(**tenant_data.model_dump(), user_id=current_user.id)
     tenant_dict = tenant.model_dump()
     tenant_dict['created_at'] = tenant_dict['created_at'].isoformat()
-    await db.tenants.insert_one(tenant_dict)
+    async with sync_write() as sync_seq:
+        tenant_dict['sync_seq'] = sync_seq
+        await db.tenants.insert_one(tenant_dict)
+    await bump_data_version(current_user.id)
     return tenant
 
 @api_router.get("/tenants", response_model=List[Tenant])
@@ -262,12 +850,14 @@ async def get_tenants(flat_id: Optional[str] = None, current_user: User = Depend
 
 @api_router.put("/tenants/{tenant_id}", response_model=Tenant)
 async def update_tenant(tenant_id: str, tenant_data: TenantCreate, current_user: User = Depends(get_current_user)):
-    result = await db.tenants.update_one(
-        {"id": tenant_id, "user_id": current_user.id},
-        {"$set": tenant_data.model_dump()}
-    )
+    async with sync_write() as sync_seq:
+        result = await db.tenants.update_one(
+            {"id": tenant_id, "user_id": current_user.id},
+            {"$set": {**tenant_data.model_dump(), "sync_seq": sync_seq}}
+        )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Tenant not found")
+    await bump_data_version(current_user.id)
     tenant = await db.tenants.find_one({"id": tenant_id}, {"_id": 0})
     if isinstance(tenant['created_at'], str):
         tenant['created_at'] = datetime.fromisoformat(tenant['created_at'])
@@ -275,9 +865,15 @@ async def update_tenant(tenant_id: str, tenant_data: TenantCreate, current_user:
 
 @api_router.delete("/tenants/{tenant_id}")
 async def delete_tenant(tenant_id: str, current_user: User = Depends(get_current_user)):
-    result = await db.tenants.delete_one({"id": tenant_id, "user_id": current_user.id})
-    if result.deleted_count == 0:
+    tenant = await db.tenants.find_one_and_delete({"id": tenant_id, "user_id": current_user.id})
+    if not tenant:
         raise HTTPException(status_code=404, detail="Tenant not found")
+    async with sync_write() as sync_seq:
+        await db.tombstones.insert_one({
+            "kind": "tenant", "id": tenant_id, "user_id": current_user.id,
+            "flat_id": tenant["flat_id"], "sync_seq": sync_seq
+        })
+    await bump_data_version(current_user.id)
     return {"message": "Tenant deleted successfully"}
 
 # Expense Routes
@@ -297,7 +893,10 @@ async def create_expense(expense_data: ExpenseCreate, current_user: User = Depen
     expense = Expense(**{**expense_dict, 'date': date}, user_id=current_user.id)
     expense_dict = expense.model_dump()
     expense_dict['date'] = expense_dict['date'].isoformat()
-    await db.expenses.insert_one(expense_dict)
+    async with sync_write() as sync_seq:
+        expense_dict['sync_seq'] = sync_seq
+        await db.expenses.insert_one(expense_dict)
+    await bump_data_version(current_user.id)
     return expense
 
 @api_router.get("/expenses", response_model=List[Expense])
@@ -312,43 +911,515 @@ async def get_expenses(
         query["flat_id"] = flat_id
     
     if start_date or end_date:
-        date_query = {}
-        if start_date:
-            date_query["$gte"] = datetime.fromisoformat(start_date).isoformat()
-        if end_date:
-            date_query["$lte"] = datetime.fromisoformat(end_date).isoformat()
-        query["date"] = date_query
+        query["date"] = build_date_query(start_date, end_date)
     
     expenses = await db.expenses.find(query, {"_id": 0}).to_list(10000)
+    if await reaches_cold_tier(query.get("date", {}).get("$gte")):
+        # Skip rows caught mid-move by the archival job
+        hot_ids = {expense['id'] for expense in expenses}
+        archived = await db.expenses_archive.find(query, {"_id": 0}).to_list(10000)
+        expenses += [expense for expense in archived if expense['id'] not in hot_ids]
     for expense in expenses:
         if isinstance(expense['date'], str):
             expense['date'] = datetime.fromisoformat(expense['date'])
     return expenses
 
+# Frequent descriptions per user, served to the expense dialog's autocomplete
+AUTOCOMPLETE_CACHE_TTL_SECONDS = int(os.environ.get('AUTOCOMPLETE_CACHE_TTL_SECONDS', '300'))
+AUTOCOMPLETE_MAX_DESCRIPTIONS = 500
+
+async def get_frequent_descriptions(user_id: str):
+    """[[lowercased, description], ...], most used first."""
+    cached = await cache.get(user_cache_namespace(user_id), "descriptions")
+    if cached is not None:
+        return cached
+    
+    rows = await db.expenses.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": "$description", "count": {"$sum": 1}, "last_used": {"$max": "$date"}}},
+        {"$sort": {"count": -1, "last_used": -1}},
+        {"$limit": AUTOCOMPLETE_MAX_DESCRIPTIONS}
+    ]).to_list(None)
+    descriptions = [[row["_id"].lower(), row["_id"]] for row in rows if row["_id"]]
+    await cache.set(user_cache_namespace(user_id), "descriptions", descriptions, AUTOCOMPLETE_CACHE_TTL_SECONDS)
+    return descriptions
+
+@api_router.get("/expenses/search", response_model=ExpenseSearchResults)
+async def search_expenses(
+    q: str = Query(..., min_length=1),
+    flat_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    query = {"user_id": current_user.id, "$text": {"$search": q}}
+    if flat_id:
+        query["flat_id"] = flat_id
+    if start_date or end_date:
+        query["date"] = build_date_query(start_date, end_date)
+    
+    projection = {"_id": 0, "score": {"$meta": "textScore"}}
+    ranking = [("score", {"$meta": "textScore"}), ("date", DESCENDING)]
+    if await reaches_cold_tier(query.get("date", {}).get("$gte")):
+        # Rank the top skip + limit hits of each tier together, then page
+        hot, cold, hot_total, cold_total = await asyncio.gather(
+            db.expenses.find(query, projection).sort(ranking).limit(skip + limit).to_list(skip + limit),
+            db.expenses_archive.find(query, projection).sort(ranking).limit(skip + limit).to_list(skip + limit),
+            db.expenses.count_documents(query),
+            db.expenses_archive.count_documents(query),
+        )
+        results = sorted(hot + cold, key=lambda e: (e['score'], e['date']), reverse=True)[skip:skip + limit]
+        total = hot_total + cold_total
+    else:
+        cursor = db.expenses.find(query, projection).sort(ranking).skip(skip).limit(limit)
+        results, total = await asyncio.gather(cursor.to_list(limit), db.expenses.count_documents(query))
+    for expense in results:
+        if isinstance(expense['date'], str):
+            expense['date'] = datetime.fromisoformat(expense['date'])
+    return ExpenseSearchResults(total=total, skip=skip, limit=limit, results=results)
+
+@api_router.get("/expenses/autocomplete", response_model=List[str])
+async def autocomplete_descriptions(
+    prefix: str = "",
+    limit: int = Query(10, ge=1, le=50),
+    current_user: User = Depends(get_current_user)
+):
+    prefix = prefix.strip().lower()
+    descriptions = await get_frequent_descriptions(current_user.id)
+    matches = []
+    for lowered, description in descriptions:
+        if lowered.startswith(prefix) and lowered != prefix:
+            matches.append(description)
+            if len(matches) == limit:
+                break
+    return matches
+
 @api_router.put("/expenses/{expense_id}", response_model=Expense)
 async def update_expense(expense_id: str, expense_data: ExpenseCreate, current_user: User = Depends(get_current_user)):
     update_dict = expense_data.model_dump()
     if update_dict.get('date'):
         update_dict['date'] = update_dict['date'].isoformat()
     
-    result = await db.expenses.update_one(
-        {"id": expense_id, "user_id": current_user.id},
-        {"$set": update_dict}
-    )
+    async with sync_write() as sync_seq:
+        update_dict['sync_seq'] = sync_seq
+        collection = db.expenses
+        result = await collection.update_one(
+            {"id": expense_id, "user_id": current_user.id},
+            {"$set": update_dict}
+        )
+        archived = result.matched_count == 0
+        if archived:
+            collection = db.expenses_archive
+            result = await collection.update_one(
+                {"id": expense_id, "user_id": current_user.id},
+                {"$set": update_dict}
+            )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Expense not found")
-    expense = await db.expenses.find_one({"id": expense_id}, {"_id": 0})
+    if archived:
+        await rebuild_archive_summary([current_user.id])
+    await bump_data_version(current_user.id)
+    expense = await collection.find_one({"id": expense_id}, {"_id": 0})
     if isinstance(expense['date'], str):
         expense['date'] = datetime.fromisoformat(expense['date'])
     return Expense(**expense)
 
 @api_router.delete("/expenses/{expense_id}")
 async def delete_expense(expense_id: str, current_user: User = Depends(get_current_user)):
-    result = await db.expenses.delete_one({"id": expense_id, "user_id": current_user.id})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Expense not found")
+    expense = await db.expenses.find_one_and_delete({"id": expense_id, "user_id": current_user.id})
+    if not expense:
+        expense = await db.expenses_archive.find_one_and_delete({"id": expense_id, "user_id": current_user.id})
+        if not expense:
+            raise HTTPException(status_code=404, detail="Expense not found")
+        await rebuild_archive_summary([current_user.id])
+    async with sync_write() as sync_seq:
+        await db.tombstones.insert_one({
+            "kind": "expense", "id": expense_id, "user_id": current_user.id,
+            "flat_id": expense["flat_id"], "sync_seq": sync_seq
+        })
+    await bump_data_version(current_user.id)
     return {"message": "Expense deleted successfully"}
 
+# Expense archival (cold tier)
+# Expenses dated before the archive boundary are moved out of `expenses` into
+# `expenses_archive`, with per-month totals kept in `expense_archive_summary`.
+EXPENSE_ARCHIVE_AFTER_DAYS = int(os.environ.get('EXPENSE_ARCHIVE_AFTER_DAYS', '0'))  # 0 disables archival
+EXPENSE_ARCHIVE_INTERVAL_HOURS = float(os.environ.get('EXPENSE_ARCHIVE_INTERVAL_HOURS', '24'))
+EXPENSE_ARCHIVE_BATCH_SIZE = int(os.environ.get('EXPENSE_ARCHIVE_BATCH_SIZE', '1000'))
+EXPENSE_ARCHIVE_LEASE = "expense_archival"
+EXPENSE_ARCHIVE_POLL_SECONDS = 60
+EXPENSE_ARCHIVE_RETRY_SECONDS = 900
+ARCHIVE_BOUNDARY_REFRESH_SECONDS = 60
+_archive_boundary = {"value": None, "expires_at": 0.0}
+
+async def get_archive_boundary() -> Optional[str]:
+    """ISO date before which expenses may be archived, or None if nothing is."""
+    if _archive_boundary["expires_at"] <= time.monotonic():
+        state = await db.archive_state.find_one({"_id": "expenses"})
+        _archive_boundary["value"] = state["archived_before"] if state else None
+        _archive_boundary["expires_at"] = time.monotonic() + ARCHIVE_BOUNDARY_REFRESH_SECONDS
+    return _archive_boundary["value"]
+
+async def reaches_cold_tier(start: Optional[str]) -> bool:
+    boundary = await get_archive_boundary()
+    return boundary is not None and (start is None or start < boundary)
+
+async def build_expense_pipeline(match: dict, start: Optional[str]) -> list:
+    """Aggregation prefix over expenses, unioned with the archive when start reaches it."""
+    pipeline = [{"$match": match}]
+    if await reaches_cold_tier(start):
+        pipeline.append({"$unionWith": {"coll": "expenses_archive", "pipeline": [{"$match": match}]}})
+    return pipeline
+
+async def sum_archived_expenses(flat_id: str, date_query: dict) -> float:
+    if not await reaches_cold_tier(date_query.get("$gte")):
+        return 0
+    if date_query:
+        source, match, field = db.expenses_archive, {"flat_id": flat_id, "date": date_query}, "$amount"
+    else:
+        source, match, field = db.expense_archive_summary, {"flat_id": flat_id}, "$total_amount"
+    rows = await source.aggregate([
+        {"$match": match},
+        {"$group": {"_id": None, "total": {"$sum": field}}}
+    ]).to_list(1)
+    return rows[0]["total"] if rows else 0
+
+async def drop_archived_copies(expenses: list) -> list:
+    """Hot expenses minus those already copied (and summarized) into the archive.
+
+    Below the boundary the archive is the source of truth; a hot row there only
+    counts until the archival job has copied it.
+    """
+    boundary = await get_archive_boundary()
+    below = [expense['id'] for expense in expenses if boundary is not None and expense['date'] < boundary]
+    if not below:
+        return expenses
+    archived = await db.expenses_archive.find({"id": {"$in": below}}, {"_id": 0, "id": 1}).to_list(None)
+    archived_ids = {row['id'] for row in archived}
+    return [expense for expense in expenses if expense['id'] not in archived_ids]
+
+async def rebuild_archive_summary(user_ids: List[str]):
+    rebuilt_at = datetime.now(timezone.utc).isoformat()
+    await db.expenses_archive.aggregate([
+        {"$match": {"user_id": {"$in": user_ids}}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "flat_id": "$flat_id", "month": {"$substrCP": ["$date", 0, 7]}},
+            "total_amount": {"$sum": "$amount"},
+            "count": {"$sum": 1}
+        }},
+        {"$addFields": {
+            "user_id": "$_id.user_id",
+            "flat_id": "$_id.flat_id",
+            "month": "$_id.month",
+            "rebuilt_at": rebuilt_at
+        }},
+        {"$merge": {"into": "expense_archive_summary", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]).to_list(None)
+    # Months that no longer have archived expenses were not rewritten above
+    await db.expense_archive_summary.delete_many({"user_id": {"$in": user_ids}, "rebuilt_at": {"$lt": rebuilt_at}})
+
+async def archive_old_expenses(archive_after_days: int = EXPENSE_ARCHIVE_AFTER_DAYS) -> int:
+    """Move expenses older than archive_after_days (rounded down to a month) to the archive."""
+    cutoff, _ = _period_bounds("month", datetime.now(timezone.utc) - timedelta(days=archive_after_days))
+    cutoff = cutoff.isoformat()
+    
+    # Publish the boundary first, and give other workers time to pick it up,
+    # so no reader skips the archive while rows are moving into it
+    state = await db.archive_state.find_one({"_id": "expenses"})
+    if not state or state["archived_before"] < cutoff:
+        await db.archive_state.update_one({"_id": "expenses"}, {"$max": {"archived_before": cutoff}}, upsert=True)
+        _archive_boundary["expires_at"] = 0.0
+        await asyncio.sleep(ARCHIVE_BOUNDARY_REFRESH_SECONDS)
+    
+    moved = 0
+    while True:
+        batch = await db.expenses.find(
+            {"date": {"$lt": cutoff}}, {"_id": 0}
+        ).limit(EXPENSE_ARCHIVE_BATCH_SIZE).to_list(EXPENSE_ARCHIVE_BATCH_SIZE)
+        if not batch:
+            break
+        # Upserting by id keeps a re-run after a crash from duplicating rows
+        await db.expenses_archive.bulk_write(
+            [ReplaceOne({"id": doc["id"]}, doc, upsert=True) for doc in batch], ordered=False
+        )
+        # Summarize before deleting from the hot tier: a crash in between leaves
+        # the rows in both tiers, where readers count the archived copy, and the
+        # next run finishes the move
+        await rebuild_archive_summary(list({doc["user_id"] for doc in batch}))
+        # Only delete rows nobody edited or deleted since they were copied
+        removed = await asyncio.gather(*(
+            db.expenses.find_one_and_delete({"id": doc["id"], "sync_seq": doc.get("sync_seq")}, {"_id": 1})
+            for doc in batch
+        ))
+        stale = [doc for doc, row in zip(batch, removed) if row is None]
+        if stale:
+            # Drop their copies; edited rows that are still old are moved again
+            await db.expenses_archive.delete_many({"id": {"$in": [doc["id"] for doc in stale]}})
+            await rebuild_archive_summary(list({doc["user_id"] for doc in stale}))
+        moved += len(batch) - len(stale)
+    return moved
+
+async def run_expense_archival():
+    # Every worker polls; the lease lets one of them archive and then stays
+    # parked until the next run is due
+    while True:
+        try:
+            token = await acquire_lease(EXPENSE_ARCHIVE_LEASE)
+            if token:
+                next_run = datetime.now(timezone.utc) + timedelta(hours=EXPENSE_ARCHIVE_INTERVAL_HOURS)
+                try:
+                    moved = await run_under_lease(db.leases, {"_id": EXPENSE_ARCHIVE_LEASE}, token, archive_old_expenses())
+                    if moved:
+                        logger.info("Archived %d expenses", moved)
+                except Exception:
+                    logger.exception("Expense archival failed")
+                    next_run = datetime.now(timezone.utc) + timedelta(seconds=EXPENSE_ARCHIVE_RETRY_SECONDS)
+                await park_lease(EXPENSE_ARCHIVE_LEASE, token, next_run)
+        except Exception:
+            logger.exception("Expense archival scheduling failed")
+        await asyncio.sleep(EXPENSE_ARCHIVE_POLL_SECONDS)
+
+# Recurring Expenses
+# Templates are materialized into `expenses` by a scheduler tick. Occurrence n of
+# a template always gets the same expense id, so re-running a tick is harmless.
+RECURRING_TICK_SECONDS = int(os.environ.get('RECURRING_TICK_SECONDS', '3600'))
+RECURRING_CADENCES = {"weekly": None, "monthly": 1, "quarterly": 3, "yearly": 12}
+RECURRING_ID_NAMESPACE = uuid.UUID("6f1c2b9e-3d4a-4c8e-9b7f-2a5d8e1f0c3b")
+
+def recurring_occurrence(start: datetime, cadence: str, index: int) -> datetime:
+    months = RECURRING_CADENCES[cadence]
+    if months is None:
+        return start + timedelta(weeks=index)
+    return _add_months(start, months * index)
+
+def _schedule_next(start: datetime, end: Optional[datetime], cadence: str, index: int) -> Optional[str]:
+    occurrence = recurring_occurrence(start, cadence, index)
+    if end and occurrence > end:
+        return None
+    return occurrence.isoformat()
+
+def _parse_recurring(doc: dict) -> RecurringExpense:
+    for field in ('start_date', 'end_date', 'next_date', 'created_at'):
+        if isinstance(doc.get(field), str):
+            doc[field] = datetime.fromisoformat(doc[field])
+    return RecurringExpense(**doc)
+
+async def materialize_recurring_expenses(now: Optional[datetime] = None, template_filter: Optional[dict] = None) -> int:
+    """Insert every due occurrence in one batch and advance the templates.
+
+    The scheduler tick covers all users; template_filter narrows it, e.g. to
+    the one template a request just created or updated.
+    """
+    now = now or datetime.now(timezone.utc)
+    templates = await db.recurring_expenses.find(
+        {"next_date": {"$lte": now.isoformat()}, **(template_filter or {})}, {"_id": 0}
+    ).to_list(None)
+    
+    expenses = []
+    advances = []
+    for template in templates:
+        start = _as_utc(template["start_date"])
+        end = _as_utc(template["end_date"]) if template.get("end_date") else None
+        index = template.get("next_index", 0)
+        # Backfills every missed period since the last tick
+        while True:
+            occurrence = recurring_occurrence(start, template["cadence"], index)
+            if occurrence > now or (end and occurrence > end):
+                break
+            seed = f"{template['id']}:{template.get('revision', 0)}:{index}"
+            expenses.append({
+                "id": str(uuid.uuid5(RECURRING_ID_NAMESPACE, seed)),
+                "category": template["category"],
+                "description": template["description"],
+                "amount": template["amount"],
+                "flat_id": template["flat_id"],
+                "user_id": template["user_id"],
+                "date": occurrence.isoformat(),
+                "recurring_expense_id": template["id"],
+            })
+            index += 1
+        if index == template.get("next_index", 0):
+            continue
+        advances.append(UpdateOne(
+            # Guarded on the index read above so a concurrent tick cannot move it backwards
+            {"id": template["id"], "next_index": template.get("next_index", 0)},
+            {"$set": {
+                "next_index": index,
+                "next_date": _schedule_next(start, end, template["cadence"], index),
+                "last_date": recurring_occurrence(start, template["cadence"], index - 1).isoformat(),
+            }}
+        ))
+    
+    inserted = 0
+    if expenses:
+        async with sync_write() as sync_seq:
+            for expense in expenses:
+                expense["sync_seq"] = sync_seq
+            try:
+                result = await db.expenses.insert_many(expenses, ordered=False)
+                inserted = len(result.inserted_ids)
+            except BulkWriteError as e:
+                # Duplicate ids are occurrences an earlier tick already wrote
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+                inserted = e.details["nInserted"]
+        user_ids = list({expense["user_id"] for expense in expenses})
+        await db.users.update_many({"id": {"$in": user_ids}}, {"$inc": {"data_version": 1}})
+        for user_id in user_ids:
+            await cache.invalidate(user_cache_namespace(user_id))
+    if advances:
+        await db.recurring_expenses.bulk_write(advances, ordered=False)
+    return inserted
+
+async def run_recurring_scheduler():
+    while True:
+        try:
+            created = await materialize_recurring_expenses()
+            if created:
+                logger.info("Materialized %d recurring expenses", created)
+        except Exception:
+            logger.exception("Recurring expense materialization failed")
+        await asyncio.sleep(RECURRING_TICK_SECONDS)
+
+@api_router.post("/recurring-expenses", response_model=RecurringExpense)
+async def create_recurring_expense(template_data: RecurringExpenseCreate, current_user: User = Depends(get_current_user)):
+    if template_data.cadence not in RECURRING_CADENCES:
+        raise HTTPException(status_code=400, detail="cadence must be one of: weekly, monthly, quarterly, yearly")
+    # Verify flat belongs to user
+    flat = await db.flats.find_one({"id": template_data.flat_id, "user_id": current_user.id})
+    if not flat:
+        raise HTTPException(status_code=404, detail="Flat not found")
+    
+    start = _as_utc(template_data.start_date)
+    end = _as_utc(template_data.end_date) if template_data.end_date else None
+    template = RecurringExpense(
+        **{**template_data.model_dump(), 'start_date': start, 'end_date': end},
+        user_id=current_user.id,
+        next_date=_schedule_next(start, end, template_data.cadence, 0)
+    )
+    template_dict = template.model_dump()
+    for field in ('start_date', 'end_date', 'next_date', 'created_at'):
+        if template_dict[field]:
+            template_dict[field] = template_dict[field].isoformat()
+    template_dict['next_index'] = 0
+    template_dict['revision'] = 0
+    await db.recurring_expenses.insert_one(template_dict)
+    # Backfill occurrences already due instead of waiting for the next tick
+    await materialize_recurring_expenses(template_filter={"id": template.id})
+    return await get_recurring_expense(template.id, current_user)
+
+@api_router.get("/recurring-expenses", response_model=List[RecurringExpense])
+async def get_recurring_expenses(flat_id: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    query = {"user_id": current_user.id}
+    if flat_id:
+        query["flat_id"] = flat_id
+    templates = await db.recurring_expenses.find(query, {"_id": 0}).to_list(1000)
+    return [_parse_recurring(template) for template in templates]
+
+@api_router.get("/recurring-expenses/{template_id}", response_model=RecurringExpense)
+async def get_recurring_expense(template_id: str, current_user: User = Depends(get_current_user)):
+    template = await db.recurring_expenses.find_one({"id": template_id, "user_id": current_user.id}, {"_id": 0})
+    if not template:
+        raise HTTPException(status_code=404, detail="Recurring expense not found")
+    return _parse_recurring(template)
+
+@api_router.put("/recurring-expenses/{template_id}", response_model=RecurringExpense)
+async def update_recurring_expense(template_id: str, template_data: RecurringExpenseCreate, current_user: User = Depends(get_current_user)):
+    if template_data.cadence not in RECURRING_CADENCES:
+        raise HTTPException(status_code=400, detail="cadence must be one of: weekly, monthly, quarterly, yearly")
+    template = await db.recurring_expenses.find_one({"id": template_id, "user_id": current_user.id}, {"_id": 0})
+    if not template:
+        raise HTTPException(status_code=404, detail="Recurring expense not found")
+    # Verify flat belongs to user
+    flat = await db.flats.find_one({"id": template_data.flat_id, "user_id": current_user.id})
+    if not flat:
+        raise HTTPException(status_code=404, detail="Flat not found")
+    
+    # Already materialized expenses are kept; the new schedule resumes after the last one
+    start = _as_utc(template_data.start_date)
+    end = _as_utc(template_data.end_date) if template_data.end_date else None
+    last_date = _as_utc(template["last_date"]) if template.get("last_date") else None
+    index = 0
+    while last_date and recurring_occurrence(start, template_data.cadence, index) <= last_date:
+        index += 1
+    
+    update_dict = template_data.model_dump()
+    update_dict['start_date'] = start.isoformat()
+    update_dict['end_date'] = end.isoformat() if end else None
+    update_dict['next_index'] = index
+    update_dict['next_date'] = _schedule_next(start, end, template_data.cadence, index)
+    await db.recurring_expenses.update_one(
+        {"id": template_id, "user_id": current_user.id},
+        {"$set": update_dict, "$inc": {"revision": 1}}
+    )
+    await materialize_recurring_expenses(template_filter={"id": template_id})
+    return await get_recurring_expense(template_id, current_user)
+
+@api_router.delete("/recurring-expenses/{template_id}")
+async def delete_recurring_expense(template_id: str, current_user: User = Depends(get_current_user)):
+    result = await db.recurring_expenses.delete_one({"id": template_id, "user_id": current_user.id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Recurring expense not found")
+    return {"message": "Recurring expense deleted successfully"}
+
+# Incremental Sync
+@api_router.get("/sync", response_model=SyncChanges)
+async def sync_changes(
+    since: Optional[str] = None,
+    flat_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Flats, tenants and expenses changed after `since`, plus tombstones for deletions.
+
+    Without a token everything is returned (and no tombstones). Pass the returned
+    token as `since` on the next call.
+    """
+    try:
+        since_seq = int(since) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    
+    # Read the counter before the in-flight writes: a write that reserved a seq
+    # at or below it either has committed (and is read below) or still holds a
+    # marker, which keeps the token under its seq. Rows committed in between may
+    # be sent twice; clients apply changes by id.
+    counter = await db.counters.find_one({"_id": "sync"})
+    token = counter["seq"] if counter else 0
+    oldest_write = await db.sync_writes.find_one(
+        {"expires_at": {"$gt": datetime.now(timezone.utc)}}, sort=[("floor", ASCENDING)]
+    )
+    if oldest_write:
+        token = min(token, oldest_write["floor"])
+    token = str(token)
+    
+    query = {"user_id": current_user.id}
+    if since_seq is not None:
+        query["sync_seq"] = {"$gt": since_seq}
+    flat_query = {**query, "id": flat_id} if flat_id else query
+    child_query = {**query, "flat_id": flat_id} if flat_id else query
+    
+    flats, tenants, expenses, archived = await asyncio.gather(
+        db.flats.find(flat_query, {"_id": 0}).to_list(None),
+        db.tenants.find(child_query, {"_id": 0}).to_list(None),
+        db.expenses.find(child_query, {"_id": 0}).to_list(None),
+        db.expenses_archive.find(child_query, {"_id": 0}).to_list(None),
+    )
+    deleted = []
+    if since_seq is not None:
+        deleted = await db.tombstones.find(child_query, {"_id": 0}).to_list(None)
+    for doc in flats + tenants:
+        if isinstance(doc['created_at'], str):
+            doc['created_at'] = datetime.fromisoformat(doc['created_at'])
+    hot_ids = {expense['id'] for expense in expenses}
+    expenses += [expense for expense in archived if expense['id'] not in hot_ids]
+    for expense in expenses:
+        if isinstance(expense['date'], str):
+            expense['date'] = datetime.fromisoformat(expense['date'])
+    
+    return SyncChanges(token=token, flats=flats, tenants=tenants, expenses=expenses, deleted=deleted)
+
 # Dashboard & Analytics
 @api_router.get("/dashboard", response_model=DashboardStats)
 async def get_dashboard(
@@ -356,14 +1427,19 @@ async def get_dashboard(
     end_date: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
+    # Keyed by data_version like the forecast: a dashboard computed while a write
+    # lands is stored under the old version, which no later request asks for
+    user_doc = await db.users.find_one({"id": current_user.id}, {"_id": 0, "data_version": 1})
+    data_version = user_doc.get("data_version", 0) if user_doc else 0
+    cache_key = f"dashboard:{data_version}:{start_date or ''}:{end_date or ''}"
+    cached = await cache.get(user_cache_namespace(current_user.id), cache_key)
+    if cached is not None:
+        return DashboardStats.model_validate(cached)
+    
+    # Stays on the primary: a lagging read would stay cached for the full TTL
     flats = await db.flats.find({"user_id": current_user.id}, {"_id": 0}).to_list(1000)
     
-    date_query = {}
-    if start_date or end_date:
-        if start_date:
-            date_query["$gte"] = datetime.fromisoformat(start_date).isoformat()
-        if end_date:
-            date_query["$lte"] = datetime.fromisoformat(end_date).isoformat()
+    date_query = build_date_query(start_date, end_date)
     
     flats_summary = []
     total_income = 0
@@ -385,7 +1461,9 @@ async def get_dashboard(
         if date_query:
             expense_query["date"] = date_query
         expenses = await db.expenses.find(expense_query, {"_id": 0}).to_list(10000)
+        expenses = await drop_archived_copies(expenses)
         expense_total = sum(e['amount'] for e in expenses)
+        expense_total += await sum_archived_expenses(flat.id, date_query)
         
         profit = income - expense_total
         profit_percentage = (profit / income * 100) if income > 0 else 0
@@ -406,7 +1484,7 @@ async def get_dashboard(
     avg_profit_percentage = (total_profit / total_income * 100) if total_income > 0 else 0
     total_tenants = sum(fs.tenant_count for fs in flats_summary)
     
-    return DashboardStats(
+    stats = DashboardStats(
         total_flats=len(flats),
         total_tenants=total_tenants,
         total_income=total_income,
@@ -415,8 +1493,1066 @@ async def get_dashboard(
         average_profit_percentage=avg_profit_percentage,
         flats_summary=flats_summary
     )
+    await cache.set(user_cache_namespace(current_user.id), cache_key, stats.model_dump(mode="json"), CACHE_TTL_SECONDS)
+    return stats
+
+PERIOD_MONTHS = {"month": 1, "quarter": 3, "year": 12}
+COMPARISON_BASELINES = ("previous", "last_year")
+
+def _add_months(dt: datetime, months: int) -> datetime:
+    month_index = dt.month - 1 + months
+    year = dt.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(dt.day, calendar.monthrange(year, month)[1])
+    return dt.replace(year=year, month=month, day=day)
+
+def _period_bounds(period: str, reference: datetime):
+    """Return the [start, end) window of the given period containing reference."""
+    first_month = reference.month
+    if period == "quarter":
+        first_month = 3 * ((reference.month - 1) // 3) + 1
+    elif period == "year":
+        first_month = 1
+    start = reference.replace(month=first_month, day=1, hour=0, minute=0, second=0, microsecond=0)
+    return start, _add_months(start, PERIOD_MONTHS[period])
+
+def _percentage_change(current: float, previous: float) -> Optional[float]:
+    if previous == 0:
+        return None
+    return (current - previous) / abs(previous) * 100
+
+def _period_totals(start: datetime, end: datetime, income: float, expenses: float) -> PeriodTotals:
+    profit = income - expenses
+    return PeriodTotals(
+        start=start,
+        end=end,
+        total_income=income,
+        total_expenses=expenses,
+        profit=profit,
+        profit_percentage=(profit / income * 100) if income > 0 else 0
+    )
+
+@api_router.get("/analytics/compare", response_model=PeriodComparison)
+async def compare_periods(
+    period: str = "month",
+    baseline: str = "previous",
+    reference_date: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    if period not in PERIOD_MONTHS:
+        raise HTTPException(status_code=400, detail="period must be one of: month, quarter, year")
+    if baseline not in COMPARISON_BASELINES:
+        raise HTTPException(status_code=400, detail="baseline must be one of: previous, last_year")
+
+    reference = datetime.fromisoformat(reference_date) if reference_date else datetime.now(timezone.utc)
+    if reference.tzinfo is None:
+        reference = reference.replace(tzinfo=timezone.utc)
+    current_start, current_end = _period_bounds(period, reference.astimezone(timezone.utc))
+    if baseline == "last_year":
+        previous_start, previous_end = _add_months(current_start, -12), _add_months(current_end, -12)
+    else:
+        previous_start, previous_end = _add_months(current_start, -PERIOD_MONTHS[period]), current_start
+
+    windows = {
+        "current": (current_start.isoformat(), current_end.isoformat()),
+        "previous": (previous_start.isoformat(), previous_end.isoformat()),
+    }
+    # Both windows are summed in a single pass over the matching expenses
+    expense_match = {
+        "user_id": current_user.id,
+        "$or": [{"date": {"$gte": start, "$lt": end}} for start, end in windows.values()]
+    }
+    earliest_start = min(start for start, _ in windows.values())
+    group_stage = [
+        {"$group": {
+            "_id": "$flat_id",
+            **{
+                name: {"$sum": {"$cond": [
+                    {"$and": [{"$gte": ["$date", start]}, {"$lt": ["$date", end]}]},
+                    "$amount",
+                    0
+                ]}}
+                for name, (start, end) in windows.items()
+            }
+        }}
+    ]
+    expense_pipeline = await build_expense_pipeline(expense_match, earliest_start) + group_stage
+    tenant_pipeline = [
+        {"$match": {"user_id": current_user.id}},
+        {"$group": {"_id": "$flat_id", "income": {"$sum": "$rent_amount"}}}
+    ]
+    flats, expense_rows, tenant_rows = await asyncio.gather(
+        analytics_db.flats.find({"user_id": current_user.id}, {"_id": 0}).to_list(1000),
+        analytics_db.expenses.aggregate(expense_pipeline).to_list(None),
+        analytics_db.tenants.aggregate(tenant_pipeline).to_list(None),
+    )
+    expenses_by_flat = {row["_id"]: row for row in expense_rows}
+    # Income follows the dashboard: the flat's current monthly rent roll, scaled
+    # to the period length and used for both windows
+    months = PERIOD_MONTHS[period]
+    income_by_flat = {row["_id"]: row["income"] * months for row in tenant_rows}
+
+    flats_comparison = []
+    total_income = 0
+    current_expenses = 0
+    previous_expenses = 0
+    for flat_doc in flats:
+        if isinstance(flat_doc['created_at'], str):
+            flat_doc['created_at'] = datetime.fromisoformat(flat_doc['created_at'])
+        flat = Flat(**flat_doc)
+        income = income_by_flat.get(flat.id, 0)
+        row = expenses_by_flat.get(flat.id, {})
+        current = _period_totals(current_start, current_end, income, row.get("current", 0))
+        previous = _period_totals(previous_start, previous_end, income, row.get("previous", 0))
+
+        flats_comparison.append(FlatComparison(
+            flat=flat,
+            current=current,
+            previous=previous,
+            expenses_change=current.total_expenses - previous.total_expenses,
+            expenses_change_percentage=_percentage_change(current.total_expenses, previous.total_expenses),
+            profit_change=current.profit - previous.profit,
+            profit_change_percentage=_percentage_change(current.profit, previous.profit)
+        ))
+
+        total_income += income
+        current_expenses += current.total_expenses
+        previous_expenses += previous.total_expenses
+
+    current = _period_totals(current_start, current_end, total_income, current_expenses)
+    previous = _period_totals(previous_start, previous_end, total_income, previous_expenses)
+
+    return PeriodComparison(
+        period=period,
+        baseline=baseline,
+        current=current,
+        previous=previous,
+        expenses_change=current.total_expenses - previous.total_expenses,
+        expenses_change_percentage=_percentage_change(current.total_expenses, previous.total_expenses),
+        profit_change=current.profit - previous.profit,
+        profit_change_percentage=_percentage_change(current.profit, previous.profit),
+        flats_comparison=flats_comparison
+    )
+
+FORECAST_RIDGE = 1e-3
+FORECAST_SEASONAL_PENALTY = 1e9
+FORECAST_MIN_SEASONAL_HISTORY = 24
+FORECAST_CACHE_SIZE = 256
+_forecast_cache = {}  # (user_id, data_version, month, months, history) -> ProfitForecast
+
+def fit_expense_forecast(series: "np.ndarray", observed: "np.ndarray", first_month: int, horizon: int):
+    """Fit trend (+ month-of-year seasonality) to every flat's series at once.
+
+    series and observed are (flats, history) arrays; observed masks out months
+    before a flat has any data. Returns (flats, horizon) projected expenses.
+    """
+    history = series.shape[1]
+    t = np.arange(history + horizon)
+    columns = [np.ones(len(t)), t / history]
+    seasonal = history >= FORECAST_MIN_SEASONAL_HISTORY
+    if seasonal:
+        month_of_year = (first_month + t) % 12
+        columns += [(month_of_year == m).astype(float) for m in range(1, 12)]
+    design = np.stack(columns, axis=1)
+    past, future = design[:history], design[history:]
+    
+    # Weighted least squares per flat, solved as one batch of normal equations.
+    # Flats with less than two years of data get their seasonal terms pinned to zero.
+    weights = observed.astype(float)
+    penalty = np.full((series.shape[0], design.shape[1]), FORECAST_RIDGE)
+    if seasonal:
+        penalty[weights.sum(axis=1) < FORECAST_MIN_SEASONAL_HISTORY, 2:] = FORECAST_SEASONAL_PENALTY
+    gram = np.einsum('hk,fh,hj->fkj', past, weights, past) + penalty[:, :, None] * np.eye(design.shape[1])
+    moment = np.einsum('hk,fh->fk', past, weights * series)
+    coefficients = np.linalg.solve(gram, moment[..., None])[..., 0]
+    return np.clip(coefficients @ future.T, 0, None), seasonal
+
+def _projections(months: List[str], income: "np.ndarray", expenses: "np.ndarray") -> List[MonthlyProjection]:
+    profit = income - expenses
+    percentage = np.divide(profit * 100, income, out=np.zeros_like(profit), where=income > 0)
+    return [
+        MonthlyProjection(
+            month=month,
+            projected_income=float(income[i]),
+            projected_expenses=float(expenses[i]),
+            projected_profit=float(profit[i]),
+            profit_percentage=float(percentage[i])
+        )
+        for i, month in enumerate(months)
+    ]
+
+@api_router.get("/analytics/forecast", response_model=ProfitForecast)
+async def forecast_profit(
+    months: int = Query(6, ge=1, le=24),
+    history: int = Query(24, ge=3, le=60),
+    current_user: User = Depends(get_current_user)
+):
+    # Stays on the primary: a lagging read would be cached under the new data_version
+    user_doc = await db.users.find_one({"id": current_user.id}, {"_id": 0, "data_version": 1})
+    data_version = user_doc.get("data_version", 0)
+    this_month, _ = _period_bounds("month", datetime.now(timezone.utc))
+    cache_key = (current_user.id, data_version, this_month, months, history)
+    if cache_key in _forecast_cache:
+        return _forecast_cache[cache_key]
+    
+    # Complete months only: [history_start, this_month)
+    history_start = _add_months(this_month, -history)
+    history_months = [_add_months(history_start, i).strftime("%Y-%m") for i in range(history)]
+    future_months = [_add_months(this_month, i).strftime("%Y-%m") for i in range(months)]
+    
+    expense_match = {
+        "user_id": current_user.id,
+        "date": {"$gte": history_start.isoformat(), "$lt": this_month.isoformat()}
+    }
+    expense_pipeline = await build_expense_pipeline(expense_match, history_start.isoformat()) + [
+        {"$group": {
+            "_id": {"flat_id": "$flat_id", "month": {"$substrCP": ["$date", 0, 7]}},
+            "total": {"$sum": "$amount"}
+        }}
+    ]
+    tenant_pipeline = [
+        {"$match": {"user_id": current_user.id}},
+        {"$group": {"_id": "$flat_id", "income": {"$sum": "$rent_amount"}}}
+    ]
+    flats, expense_rows, tenant_rows = await asyncio.gather(
+        db.flats.find({"user_id": current_user.id}, {"_id": 0}).to_list(1000),
+        db.expenses.aggregate(expense_pipeline).to_list(None),
+        db.tenants.aggregate(tenant_pipeline).to_list(None),
+    )
+    
+    flat_index = {flat["id"]: i for i, flat in enumerate(flats)}
+    month_index = {month: i for i, month in enumerate(history_months)}
+    rows = [r for r in expense_rows if r["_id"]["flat_id"] in flat_index and r["_id"]["month"] in month_index]
+    series = np.zeros((len(flats), history))
+    if rows:
+        series[
+            [flat_index[r["_id"]["flat_id"]] for r in rows],
+            [month_index[r["_id"]["month"]] for r in rows]
+        ] = [r["total"] for r in rows]
+    
+    # A flat's series starts at its first recorded expense or its creation month
+    created = np.array([
+        month_index.get(month, 0 if month < history_months[0] else history)
+        for month in (str(flat["created_at"])[:7] for flat in flats)
+    ], dtype=int)
+    first_expense = np.where(series.any(axis=1), (series != 0).argmax(axis=1), history)
+    observed = np.arange(history)[None, :] >= np.minimum(created, first_expense)[:, None]
+    
+    projected, seasonal = fit_expense_forecast(series, observed, history_start.month - 1, months) \
+        if flats else (np.zeros((0, months)), history >= FORECAST_MIN_SEASONAL_HISTORY)
+    # Income has no history of its own; the current rent roll is carried forward
+    income_by_flat = {row["_id"]: row["income"] for row in tenant_rows}
+    income = np.array([income_by_flat.get(flat["id"], 0) for flat in flats], dtype=float)
+    projected_income = np.repeat(income[:, None], months, axis=1)
+    
+    flats_forecast = []
+    for i, flat_doc in enumerate(flats):
+        if isinstance(flat_doc['created_at'], str):
+            flat_doc['created_at'] = datetime.fromisoformat(flat_doc['created_at'])
+        flats_forecast.append(FlatForecast(
+            flat=Flat(**flat_doc),
+            projections=_projections(future_months, projected_income[i], projected[i])
+        ))
+    
+    forecast = ProfitForecast(
+        months=months,
+        history_months=history,
+        seasonal=seasonal,
+        data_version=data_version,
+        projections=_projections(future_months, projected_income.sum(axis=0), projected.sum(axis=0)),
+        flats_forecast=flats_forecast
+    )
+    if len(_forecast_cache) >= FORECAST_CACHE_SIZE:
+        _forecast_cache.pop(next(iter(_forecast_cache)))
+    _forecast_cache[cache_key] = forecast
+    return forecast
+
+# Anomaly detection
+ANOMALY_THRESHOLD = float(os.environ.get('ANOMALY_THRESHOLD', '3.5'))
+ANOMALY_SCAN_INTERVAL_HOURS = float(os.environ.get('ANOMALY_SCAN_INTERVAL_HOURS', '24'))  # 0 disables the job
+ANOMALY_SCAN_LEASE = "anomaly_scan"
+ANOMALY_SCAN_POLL_SECONDS = 60
+ANOMALY_SCAN_RETRY_SECONDS = 900
+ANOMALY_MIN_GROUP_SIZE = 5
+ANOMALY_BATCH_SIZE = 100000
+ANOMALY_COLUMNS = ["id", "user_id", "flat_id", "category", "description", "amount", "date"]
+
+def _combine_expense_frames(frames: list) -> "pd.DataFrame":
+    if not frames:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+    # Rows caught mid-archival can be read from both tiers
+    return pd.concat(frames, ignore_index=True).drop_duplicates("id")
+
+async def load_expense_frame(query: dict) -> "pd.DataFrame":
+    """Read matching hot and archived expenses into one columnar frame.
+
+    Frame building runs in a thread, batch by batch, so a large portfolio
+    doesn't hold up the event loop.
+    """
+    projection = {"_id": 0, **{column: 1 for column in ANOMALY_COLUMNS}}
+    frames = []
+    for source in (analytics_db.expenses, analytics_db.expenses_archive):
+        cursor = source.find(query, projection).batch_size(ANOMALY_BATCH_SIZE)
+        while True:
+            batch = await cursor.to_list(ANOMALY_BATCH_SIZE)
+            if not batch:
+                break
+            frames.append(await asyncio.to_thread(pd.DataFrame.from_records, batch, columns=ANOMALY_COLUMNS))
+    return await asyncio.to_thread(_combine_expense_frames, frames)
+
+def score_expense_anomalies(frame: "pd.DataFrame", threshold: float) -> "pd.DataFrame":
+    """Flag amount outliers per (flat, category) and likely duplicate entries.
+
+    Outliers use the robust z-score |x - median| / (1.4826 * MAD); where MAD is
+    zero (mostly identical amounts, e.g. fixed rent) the mean absolute deviation
+    is used instead. Groups smaller than ANOMALY_MIN_GROUP_SIZE are not scored.
+    Returns the flagged rows with reasons, robust_z, group_median and duplicate_group.
+    """
+    if frame.empty:
+        return frame.assign(reasons=[], robust_z=[], group_median=[], duplicate_group=[])
+    
+    amount = frame["amount"].astype(float)
+    group_keys = [frame["flat_id"], frame["category"]]
+    median = amount.groupby(group_keys, sort=False).transform("median")
+    deviation = (amount - median).abs()
+    by_group = deviation.groupby(group_keys, sort=False)
+    mad, mean_deviation, size = by_group.transform("median"), by_group.transform("mean"), by_group.transform("size")
+    scale = np.where(mad > 0, 1.4826 * mad, 1.2533 * mean_deviation)
+    robust_z = np.divide(deviation.to_numpy(), scale, out=np.zeros(len(frame)), where=scale > 0)
+    outlier = (size.to_numpy() >= ANOMALY_MIN_GROUP_SIZE) & (robust_z > threshold)
+    
+    # Same flat, amount, day and (normalised) description
+    duplicate_keys = [
+        frame["user_id"],
+        frame["flat_id"],
+        amount,
+        frame["date"].astype(str).str[:10],
+        frame["description"].astype(str).str.lower().str.split().str.join(" "),
+    ]
+    duplicate_group = frame.groupby(duplicate_keys, sort=False).ngroup().to_numpy()
+    duplicate = pd.Series(duplicate_group).duplicated(keep=False).to_numpy()
+    
+    flagged = outlier | duplicate
+    reasons = np.select(
+        [outlier & duplicate, outlier, duplicate],
+        ["amount_outlier,duplicate", "amount_outlier", "duplicate"],
+        default=""
+    )
+    return frame[flagged].assign(
+        reasons=pd.Series(reasons[flagged]).str.split(",").to_numpy(),
+        robust_z=np.where(size.to_numpy() >= ANOMALY_MIN_GROUP_SIZE, robust_z, np.nan)[flagged],
+        group_median=median.to_numpy()[flagged],
+        duplicate_group=np.where(duplicate, duplicate_group, -1)[flagged],
+    )
+
+def _anomaly_from_row(row: dict) -> ExpenseAnomaly:
+    expense = {column: row[column] for column in ANOMALY_COLUMNS}
+    if isinstance(expense['date'], str):
+        expense['date'] = datetime.fromisoformat(expense['date'])
+    return ExpenseAnomaly(
+        expense=Expense(**expense),
+        reasons=row["reasons"],
+        robust_z=None if pd.isna(row["robust_z"]) else float(row["robust_z"]),
+        group_median=float(row["group_median"]),
+        duplicate_group=None if row["duplicate_group"] < 0 else int(row["duplicate_group"])
+    )
+
+async def scan_expense_anomalies(threshold: float = ANOMALY_THRESHOLD) -> int:
+    """Score the whole portfolio in one pass and replace the stored anomalies.
+
+    Callers hold the anomaly_scan lease, so only one scan writes at a time.
+    """
+    scan_id = str(uuid.uuid4())
+    latest = await db.anomaly_scans.find_one({"_id": "latest"})
+    previous_id = latest["scan_id"] if latest else None
+    # Rows of a scan that died before publishing are recorded as pending
+    pending = await db.anomaly_scans.find_one_and_replace(
+        {"_id": "pending"}, {"scan_id": scan_id}, upsert=True
+    )
+    if pending and pending["scan_id"] != previous_id:
+        await db.expense_anomalies.delete_many({"scan_id": pending["scan_id"]})
+    
+    frame = await load_expense_frame({})
+    flagged = await run_in_job_executor(score_expense_anomalies, frame, threshold)
+    scanned_at = datetime.now(timezone.utc).isoformat()
+    
+    records = flagged.astype(object).where(flagged.notna(), None).to_dict("records")
+    for record in records:
+        record["reasons"] = list(record["reasons"])
+        record["scan_id"] = scan_id
+    for start in range(0, len(records), ANOMALY_BATCH_SIZE):
+        await db.expense_anomalies.insert_many(records[start:start + ANOMALY_BATCH_SIZE])
+    await db.anomaly_scans.replace_one(
+        {"_id": "latest"},
+        {"scan_id": scan_id, "scanned_at": scanned_at, "threshold": threshold},
+        upsert=True
+    )
+    if previous_id:
+        await db.expense_anomalies.delete_many({"scan_id": previous_id})
+    return len(records)
+
+async def run_anomaly_scan():
+    # Every worker polls; the lease lets one of them scan and then stays parked
+    # until the next scan is due, so the portfolio is scanned once per interval
+    while True:
+        try:
+            token = await acquire_lease(ANOMALY_SCAN_LEASE)
+            if token:
+                started = datetime.now(timezone.utc)
+                next_scan = started + timedelta(hours=ANOMALY_SCAN_INTERVAL_HOURS)
+                try:
+                    flagged = await run_under_lease(db.leases, {"_id": ANOMALY_SCAN_LEASE}, token, scan_expense_anomalies())
+                    logger.info("Anomaly scan flagged %d expenses", flagged)
+                except Exception:
+                    logger.exception("Anomaly scan failed")
+                    next_scan = datetime.now(timezone.utc) + timedelta(seconds=ANOMALY_SCAN_RETRY_SECONDS)
+                await park_lease(ANOMALY_SCAN_LEASE, token, next_scan)
+        except Exception:
+            logger.exception("Anomaly scan scheduling failed")
+        await asyncio.sleep(ANOMALY_SCAN_POLL_SECONDS)
+
+@api_router.get("/analytics/anomalies", response_model=AnomalyReport)
+async def get_expense_anomalies(
+    live: bool = False,
+    threshold: Optional[float] = Query(None, gt=0),
+    current_user: User = Depends(get_current_user)
+):
+    """Anomalies from the latest portfolio scan, or scored now when live/threshold is given."""
+    scan = await db.anomaly_scans.find_one({"_id": "latest"})
+    if scan and not live and threshold is None:
+        rows = await db.expense_anomalies.find(
+            {"scan_id": scan["scan_id"], "user_id": current_user.id}, {"_id": 0}
+        ).to_list(None)
+        return AnomalyReport(
+            threshold=scan["threshold"],
+            scanned_at=datetime.fromisoformat(scan["scanned_at"]),
+            anomalies=[_anomaly_from_row(row) for row in rows]
+        )
+    
+    threshold = threshold or ANOMALY_THRESHOLD
+    frame = await load_expense_frame({"user_id": current_user.id})
+    flagged = await run_in_job_executor(score_expense_anomalies, frame, threshold)
+    return AnomalyReport(
+        threshold=threshold,
+        scanned_at=datetime.now(timezone.utc),
+        anomalies=[_anomaly_from_row(row) for row in flagged.to_dict("records")]
+    )
+
+# Admin Analytics
+def _portfolio_union(match: dict) -> list:
+    """One stream of per-row contributions (expenses, archived totals, rent, flats) for grouping.
+
+    Every branch filters on the same owner/flat fields, so on a sharded cluster each
+    shard does its own share and only the $group is merged.
+    """
+    return [
+        {"$match": match},
+        {"$project": {"user_id": 1, "flat_id": 1, "expenses": "$amount"}},
+        {"$unionWith": {"coll": "expense_archive_summary", "pipeline": [
+            {"$match": match},
+            {"$project": {"user_id": 1, "flat_id": 1, "expenses": "$total_amount"}}
+        ]}},
+        {"$unionWith": {"coll": "tenants", "pipeline": [
+            {"$match": match},
+            {"$project": {"user_id": 1, "flat_id": 1, "income": "$rent_amount", "tenants": {"$literal": 1}}}
+        ]}},
+    ]
+
+def _profit_fields(income: float, expenses: float) -> dict:
+    profit = income - expenses
+    return {"profit": profit, "profit_percentage": (profit / income * 100) if income > 0 else 0}
+
+@api_router.get("/admin/analytics/owners", response_model=OwnerTotalsPage)
+async def get_owner_totals(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    admin_user: User = Depends(get_admin_user)
+):
+    user_query = {"id": {"$gt": cursor}} if cursor else {}
+    users = await portfolio_db.users.find(
+        user_query, {"_id": 0, "id": 1, "name": 1, "email": 1}
+    ).sort("id", ASCENDING).limit(limit).to_list(limit)
+    user_ids = [user["id"] for user in users]
+    
+    pipeline = _portfolio_union({"user_id": {"$in": user_ids}}) + [
+        {"$unionWith": {"coll": "flats", "pipeline": [
+            {"$match": {"user_id": {"$in": user_ids}}},
+            {"$project": {"user_id": 1, "flats": {"$literal": 1}}}
+        ]}},
+        {"$group": {
+            "_id": "$user_id",
+            "total_flats": {"$sum": "$flats"},
+            "total_tenants": {"$sum": "$tenants"},
+            "total_income": {"$sum": "$income"},
+            "total_expenses": {"$sum": "$expenses"}
+        }}
+    ]
+    totals = {row["_id"]: row for row in await portfolio_db.expenses.aggregate(pipeline).to_list(None)}
+    
+    owners = []
+    for user in users:
+        row = totals.get(user["id"], {})
+        income, expenses = row.get("total_income", 0), row.get("total_expenses", 0)
+        profit = _profit_fields(income, expenses)
+        owners.append(OwnerTotals(
+            user_id=user["id"],
+            name=user["name"],
+            email=user["email"],
+            total_flats=row.get("total_flats", 0),
+            total_tenants=row.get("total_tenants", 0),
+            total_income=income,
+            total_expenses=expenses,
+            total_profit=profit["profit"],
+            profit_percentage=profit["profit_percentage"]
+        ))
+    
+    next_cursor = user_ids[-1] if len(user_ids) == limit else None
+    return OwnerTotalsPage(owners=owners, next_cursor=next_cursor)
+
+@api_router.get("/admin/analytics/top-flats", response_model=List[FlatProfit])
+async def get_top_flats(
+    limit: int = Query(10, ge=1, le=100),
+    admin_user: User = Depends(get_admin_user)
+):
+    pipeline = _portfolio_union({}) + [
+        {"$group": {
+            "_id": "$flat_id",
+            "total_income": {"$sum": "$income"},
+            "total_expenses": {"$sum": "$expenses"}
+        }},
+        {"$addFields": {"profit": {"$subtract": ["$total_income", "$total_expenses"]}}},
+        {"$sort": {"profit": -1}},
+        {"$limit": limit}
+    ]
+    rows = await portfolio_db.expenses.aggregate(pipeline).to_list(limit)
+    flats = await portfolio_db.flats.find({"id": {"$in": [row["_id"] for row in rows]}}, {"_id": 0}).to_list(limit)
+    flats_by_id = {flat["id"]: flat for flat in flats}
+    owners = await portfolio_db.users.find(
+        {"id": {"$in": [flat["user_id"] for flat in flats]}}, {"_id": 0, "id": 1, "name": 1}
+    ).to_list(limit)
+    owner_names = {owner["id"]: owner["name"] for owner in owners}
+    
+    top_flats = []
+    for row in rows:
+        flat_doc = flats_by_id.get(row["_id"])
+        if not flat_doc:
+            continue  # Rows left behind by a flat deleted mid-scan
+        if isinstance(flat_doc['created_at'], str):
+            flat_doc['created_at'] = datetime.fromisoformat(flat_doc['created_at'])
+        top_flats.append(FlatProfit(
+            flat=Flat(**flat_doc),
+            owner_name=owner_names.get(flat_doc["user_id"], ""),
+            total_income=row["total_income"],
+            total_expenses=row["total_expenses"],
+            **_profit_fields(row["total_income"], row["total_expenses"])
+        ))
+    return top_flats
+
+@api_router.get("/admin/analytics/categories", response_model=List[CategoryTotal])
+async def get_category_mix(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    admin_user: User = Depends(get_admin_user)
+):
+    match = {}
+    if start_date or end_date:
+        match["date"] = build_date_query(start_date, end_date)
+    pipeline = [
+        {"$match": match},
+        {"$unionWith": {"coll": "expenses_archive", "pipeline": [{"$match": match}]}},
+        {"$group": {"_id": "$category", "total_amount": {"$sum": "$amount"}, "expense_count": {"$sum": 1}}},
+        {"$sort": {"total_amount": -1}}
+    ]
+    rows = await portfolio_db.expenses.aggregate(pipeline).to_list(None)
+    grand_total = sum(row["total_amount"] for row in rows)
+    return [
+        CategoryTotal(
+            category=row["_id"],
+            total_amount=row["total_amount"],
+            expense_count=row["expense_count"],
+            share_percentage=(row["total_amount"] / grand_total * 100) if grand_total > 0 else 0
+        )
+        for row in rows
+    ]
+
+@api_router.get("/admin/metrics/pool", response_model=PoolMetricsReport)
+async def get_pool_metrics(admin_user: User = Depends(get_admin_user)):
+    options = dict(MONGO_POOL_OPTIONS, compressors=MONGO_COMPRESSORS.split(',') if MONGO_COMPRESSORS else [])
+    return PoolMetricsReport(
+        options=options,
+        read_preference=MONGO_READ_PREFERENCE,
+        analytics_read_preference=MONGO_ANALYTICS_READ_PREFERENCE,
+        portfolio_read_preference=MONGO_PORTFOLIO_READ_PREFERENCE,
+        servers=pool_metrics.snapshot()
+    )
+
+# Exports
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '50000'))
+EXPORT_PROJECTION = {"_id": 0, "id": 1, "flat_id": 1, "category": 1, "description": 1, "amount": 1, "date": 1}
+
+@lru_cache(maxsize=None)
+def expense_export_schema() -> "pa.Schema":
+    return pa.schema([
+        ("id", pa.string()),
+        ("flat_id", pa.dictionary(pa.int32(), pa.string())),
+        ("category", pa.dictionary(pa.int32(), pa.string())),
+        ("description", pa.string()),
+        ("amount", pa.float64()),
+        ("date", pa.timestamp("us", tz="UTC")),
+    ])
+
+class ExportSink:
+    """Write-only file object whose buffered bytes are drained into the response."""
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def write_expense_batch(writer, docs: List[dict]):
+    batch = pa.RecordBatch.from_arrays([
+        pa.array([doc["id"] for doc in docs], pa.string()),
+        pa.array([doc["flat_id"] for doc in docs], pa.string()).dictionary_encode(),
+        pa.array([doc["category"] for doc in docs], pa.string()).dictionary_encode(),
+        pa.array([doc["description"] for doc in docs], pa.string()),
+        pa.array([doc["amount"] for doc in docs], pa.float64()),
+        pa.array([_as_utc(doc["date"]) for doc in docs], pa.timestamp("us", tz="UTC")),
+    ], schema=expense_export_schema())
+    writer.write_batch(batch)
+
+async def stream_expense_export(query: dict, open_writer):
+    """Encode matching expenses batch by batch, yielding bytes as each batch is written."""
+    sink = ExportSink()
+    writer = open_writer(sink)
+    # Archived rows all predate the hot tier, so reading it first keeps the output date-ordered
+    sources = [db.expenses]
+    if await reaches_cold_tier(query.get("date", {}).get("$gte")):
+        sources.insert(0, db.expenses_archive)
+    
+    for source in sources:
+        cursor = source.find(query, EXPORT_PROJECTION).sort("date", ASCENDING).batch_size(EXPORT_BATCH_SIZE)
+        docs = []
+        async for doc in cursor:
+            docs.append(doc)
+            if len(docs) == EXPORT_BATCH_SIZE:
+                await asyncio.to_thread(write_expense_batch, writer, docs)
+                docs = []
+                yield sink.drain()
+        if docs:
+            await asyncio.to_thread(write_expense_batch, writer, docs)
+            yield sink.drain()
+    
+    await asyncio.to_thread(writer.close)
+    yield sink.drain()
+
+def build_export_query(user_id: str, flat_id: Optional[str], start_date: Optional[str], end_date: Optional[str]) -> dict:
+    query = {"user_id": user_id}
+    if flat_id:
+        query["flat_id"] = flat_id
+    if start_date or end_date:
+        query["date"] = build_date_query(start_date, end_date)
+    return query
+
+@api_router.get("/export/expenses.parquet")
+async def export_expenses_parquet(
+    flat_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    query = build_export_query(current_user.id, flat_id, start_date, end_date)
+    return StreamingResponse(
+        stream_expense_export(query, lambda sink: pq.ParquetWriter(sink, expense_export_schema(), compression="zstd")),
+        media_type="application/vnd.apache.parquet",
+        headers={"Content-Disposition": 'attachment; filename="expenses.parquet"'}
+    )
+
+@api_router.get("/export/expenses.arrow")
+async def export_expenses_arrow(
+    flat_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    query = build_export_query(current_user.id, flat_id, start_date, end_date)
+    return StreamingResponse(
+        stream_expense_export(query, lambda sink: pa.ipc.new_stream(sink, expense_export_schema())),
+        media_type="application/vnd.apache.arrow.stream",
+        headers={"Content-Disposition": 'attachment; filename="expenses.arrows"'}
+    )
+
+# Background Jobs
+# Jobs live in the `jobs` collection and are leased by whichever worker claims
+# them first; a lease that isn't renewed (worker died) lets another worker retry.
+# Each claim gets its own lease token, so only that claim can renew it or record
+# the outcome, even if the same process claims the job again after it expired.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))  # concurrent jobs per process
+JOB_EXECUTOR = os.environ.get('JOB_EXECUTOR', 'thread')  # thread or process, for CPU-bound steps
+JOB_EXECUTOR_WORKERS = int(os.environ.get('JOB_EXECUTOR_WORKERS', str(os.cpu_count() or 2)))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '60'))
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '2'))
+JOB_MAX_ATTEMPTS = 3
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+job_results = AsyncIOMotorGridFSBucket(db, bucket_name="job_results")
+_job_executor = {"executor": None}
+
+async def run_in_job_executor(fn, *args):
+    """Run a CPU-bound, picklable function on the configured thread/process pool."""
+    if _job_executor["executor"] is None:
+        executor_class = ProcessPoolExecutor if JOB_EXECUTOR == "process" else ThreadPoolExecutor
+        _job_executor["executor"] = executor_class(max_workers=JOB_EXECUTOR_WORKERS)
+    return await asyncio.get_running_loop().run_in_executor(_job_executor["executor"], partial(fn, *args))
+
+def _lease_deadline() -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)).isoformat()
+
+class LeaseLost(Exception):
+    """The lease was taken over (or could not be renewed) while work was running."""
 
-# Include router
+async def acquire_lease(name: str) -> Optional[str]:
+    """Take the named lease in `leases` if it is free or expired; returns its token."""
+    token = uuid.uuid4().hex
+    try:
+        await db.leases.update_one(
+            {"_id": name, "lease_expires_at": {"$lt": datetime.now(timezone.utc).isoformat()}},
+            {"$set": {"lease_owner": token, "lease_expires_at": _lease_deadline()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lease document exists and hasn't expired
+        return None
+    return token
+
+async def park_lease(name: str, token: str, until: datetime):
+    """Keep holding the named lease, without renewal, until the given time."""
+    await db.leases.update_one({"_id": name, "lease_owner": token}, {"$set": {"lease_expires_at": until.isoformat()}})
+
+async def run_under_lease(collection, lease_filter: dict, token: str, work):
+    """Await the work coroutine while renewing its lease; cancel it if the lease is lost.
+
+    The lease lives on the document matched by lease_filter, as lease_owner and
+    lease_expires_at. Failed renewals are retried until the lease would have
+    run out, at which point another worker may already have taken it over.
+    """
+    task = asyncio.create_task(work)
+    lost = False
+    
+    async def renew():
+        nonlocal lost
+        held_until = time.monotonic() + JOB_LEASE_SECONDS
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                result = await collection.update_one(
+                    {**lease_filter, "lease_owner": token},
+                    {"$set": {"lease_expires_at": _lease_deadline()}}
+                )
+            except PyMongoError:
+                logger.warning("Lease renewal failed for %s", lease_filter, exc_info=True)
+                if time.monotonic() < held_until:
+                    continue
+            else:
+                if result.matched_count:
+                    held_until = time.monotonic() + JOB_LEASE_SECONDS
+                    continue
+            lost = True
+            task.cancel()
+            return
+    
+    renewal = asyncio.create_task(renew())
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if lost:
+            raise LeaseLost(f"Lease lost for {lease_filter}")
+        raise
+    finally:
+        renewal.cancel()
+
+def _parse_job(doc: dict) -> Job:
+    for field in ('created_at', 'started_at', 'finished_at'):
+        if isinstance(doc.get(field), str):
+            doc[field] = datetime.fromisoformat(doc[field])
+    return Job(**doc)
+
+async def set_job_progress(job: dict, progress: float):
+    await db.jobs.update_one({"id": job["id"], "lease_owner": job["lease_owner"]}, {"$set": {"progress": progress}})
+
+async def _export_job(job: dict, user: User, open_writer, filename: str):
+    query = build_export_query(user.id, job["params"].get("flat_id"), job["params"].get("start_date"), job["params"].get("end_date"))
+    total = await db.expenses.count_documents(query) or 1
+    upload = job_results.open_upload_stream(filename, metadata={"job_id": job["id"], "user_id": user.id})
+    written = 0
+    async for chunk in stream_expense_export(query, open_writer):
+        await upload.write(chunk)
+        written = min(written + EXPORT_BATCH_SIZE, total)
+        await set_job_progress(job, written / total)
+    await upload.close()
+    return {"filename": filename}, str(upload._id)
+
+async def _dashboard_job(job: dict, user: User):
+    stats = await get_dashboard(job["params"].get("start_date"), job["params"].get("end_date"), current_user=user)
+    return stats.model_dump(mode="json"), None
+
+async def _delete_flat_job(job: dict, user: User):
+    return await delete_flat(job["params"]["flat_id"], current_user=user), None
+
+async def _anomalies_job(job: dict, user: User):
+    report = await get_expense_anomalies(live=True, threshold=job["params"].get("threshold"), current_user=user)
+    return report.model_dump(mode="json"), None
+
+JOB_HANDLERS = {
+    "dashboard": _dashboard_job,
+    "export_parquet": partial(
+        _export_job,
+        open_writer=lambda sink: pq.ParquetWriter(sink, expense_export_schema(), compression="zstd"),
+        filename="expenses.parquet"
+    ),
+    "export_arrow": partial(
+        _export_job,
+        open_writer=lambda sink: pa.ipc.new_stream(sink, expense_export_schema()),
+        filename="expenses.arrows"
+    ),
+    "delete_flat": _delete_flat_job,
+    "anomalies": _anomalies_job,
+}
+
+async def claim_job() -> Optional[dict]:
+    now = datetime.now(timezone.utc).isoformat()
+    return await db.jobs.find_one_and_update(
+        {"$or": [
+            {"status": "queued"},
+            {"status": "running", "lease_expires_at": {"$lt": now}},
+        ]},
+        {
+            "$set": {
+                "status": "running",
+                "lease_owner": uuid.uuid4().hex,
+                "worker_id": WORKER_ID,
+                "lease_expires_at": _lease_deadline(),
+                "started_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def run_job(job: dict):
+    update = {"finished_at": datetime.now(timezone.utc).isoformat()}
+    if job["attempts"] > JOB_MAX_ATTEMPTS:
+        update.update(status="failed", error="Job exceeded its retry limit")
+    else:
+        try:
+            user_doc = await db.users.find_one({"id": job["user_id"]}, {"_id": 0, "hashed_password": 0})
+            if isinstance(user_doc.get('created_at'), str):
+                user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
+            handler = JOB_HANDLERS[job["type"]](job, User(**user_doc))
+            result, result_file = await run_under_lease(db.jobs, {"id": job["id"]}, job["lease_owner"], handler)
+            update.update(status="succeeded", progress=1, result=result, result_file=result_file)
+        except LeaseLost:
+            # Whoever holds the lease now owns the job and its outcome
+            logger.warning("Job %s lost its lease, abandoning", job["id"])
+            return
+        except HTTPException as e:
+            update.update(status="failed", error=e.detail)
+        except Exception as e:
+            logger.exception("Job %s failed", job["id"])
+            update.update(status="failed", error=str(e))
+        update["finished_at"] = datetime.now(timezone.utc).isoformat()
+    # Only the current lease holder may record the outcome
+    await db.jobs.update_one({"id": job["id"], "lease_owner": job["lease_owner"]}, {"$set": update})
+
+async def job_worker():
+    while True:
+        try:
+            job = await claim_job()
+            if job:
+                await run_job(job)
+                continue
+        except Exception:
+            logger.exception("Job worker error")
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+@api_router.post("/jobs", response_model=Job)
+async def create_job(job_data: JobCreate, current_user: User = Depends(get_current_user)):
+    if job_data.type not in JOB_HANDLERS:
+        raise HTTPException(status_code=400, detail=f"type must be one of: {', '.join(JOB_HANDLERS)}")
+    if job_data.type == "delete_flat" and not job_data.params.get("flat_id"):
+        raise HTTPException(status_code=400, detail="delete_flat requires params.flat_id")
+    
+    job = Job(**job_data.model_dump(), user_id=current_user.id)
+    job_dict = job.model_dump()
+    job_dict['created_at'] = job_dict['created_at'].isoformat()
+    await db.jobs.insert_one(job_dict)
+    return job
+
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = await db.jobs.find_one({"id": job_id, "user_id": current_user.id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _parse_job(job)
+
+@api_router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, current_user: User = Depends(get_current_user)):
+    job = await get_job(job_id, current_user)
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    if not job.result_file:
+        return job.result
+    
+    download = await job_results.open_download_stream(ObjectId(job.result_file))
+    
+    async def chunks():
+        while True:
+            chunk = await download.readchunk()
+            if not chunk:
+                break
+            yield chunk
+    
+    filename = job.result["filename"]
+    media_type = "application/vnd.apache.parquet" if filename.endswith(".parquet") else "application/vnd.apache.arrow.stream"
+    return StreamingResponse(chunks(), media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Startup
+# The worker serves /healthz as soon as it is up; /readyz stays 503 until the
+# warm-up below has reached Mongo, built indexes and loaded the hot paths.
+STARTUP_RETRY_SECONDS = float(os.environ.get('STARTUP_RETRY_SECONDS', '2'))
+STARTUP_MAX_ATTEMPTS = int(os.environ.get('STARTUP_MAX_ATTEMPTS', '5'))  # per phase, then /healthz fails
+STARTUP_MAX_BACKOFF_SECONDS = 60
+READINESS_PING_TIMEOUT_SECONDS = float(os.environ.get('READINESS_PING_TIMEOUT_SECONDS', '2'))
+readiness = {"ready": False, "phase": "starting", "error": None, "timings": {}}
+background_tasks = []
+
+async def create_indexes():
+    # Expenses are always queried per user; the text index is scoped the same way
+    for collection in (db.expenses, db.expenses_archive):
+        await collection.create_index(
+            [("user_id", ASCENDING), ("description", TEXT), ("category", TEXT)],
+            name="expense_text",
+            weights={"description": 3, "category": 1}
+        )
+        await collection.create_index([("flat_id", ASCENDING), ("date", ASCENDING)])
+    await db.expenses.create_index([("id", ASCENDING)], unique=True)
+    await db.expenses.create_index([("date", ASCENDING)])
+    await db.expenses.create_index([("user_id", ASCENDING), ("date", ASCENDING)])
+    await db.users.create_index([("id", ASCENDING)], unique=True)
+    await db.tenants.create_index([("user_id", ASCENDING), ("flat_id", ASCENDING)])
+    await db.flats.create_index([("user_id", ASCENDING)])
+    await db.flats.create_index([("id", ASCENDING)], unique=True)
+    for collection in (db.flats, db.tenants, db.expenses, db.expenses_archive, db.tombstones):
+        await collection.create_index([("user_id", ASCENDING), ("sync_seq", ASCENDING)])
+    await db.expenses_archive.create_index([("id", ASCENDING)], unique=True)
+    await db.expense_archive_summary.create_index([("user_id", ASCENDING), ("flat_id", ASCENDING)])
+    await db.recurring_expenses.create_index([("next_date", ASCENDING)])
+    await db.recurring_expenses.create_index([("user_id", ASCENDING), ("flat_id", ASCENDING)])
+    await db.expense_anomalies.create_index([("scan_id", ASCENDING), ("user_id", ASCENDING)])
+    await db.jobs.create_index([("id", ASCENDING)], unique=True)
+    await db.sync_writes.create_index([("floor", ASCENDING)])
+    await db.sync_writes.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+    await db.jobs.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+
+async def wait_for_mongo():
+    while True:
+        try:
+            await client.admin.command("ping")
+            return
+        except PyMongoError as exc:
+            readiness["error"] = str(exc)
+            logger.warning("MongoDB not reachable yet: %s", exc)
+            await asyncio.sleep(STARTUP_RETRY_SECONDS)
+
+def _warm_cpu_paths():
+    for module in (np, pd, pa, pq):
+        module.load()
+    expense_export_schema()
+    # The first bcrypt call loads and self-tests the backend
+    verify_password("warm-up", get_password_hash("warm-up"))
+
+async def warm_caches():
+    await asyncio.gather(get_archive_boundary(), asyncio.to_thread(_warm_cpu_paths))
+
+def start_background_loops():
+    if EXPENSE_ARCHIVE_AFTER_DAYS > 0:
+        background_tasks.append(asyncio.create_task(run_expense_archival()))
+    if ANOMALY_SCAN_INTERVAL_HOURS > 0:
+        background_tasks.append(asyncio.create_task(run_anomaly_scan()))
+    background_tasks.append(asyncio.create_task(run_recurring_scheduler()))
+    for _ in range(JOB_WORKERS):
+        background_tasks.append(asyncio.create_task(job_worker()))
+
+async def run_startup_phase(phase: str, step) -> bool:
+    """Run one warm-up step, retrying with backoff (e.g. across a primary stepdown)."""
+    readiness["phase"] = phase
+    phase_started = time.perf_counter()
+    for attempt in range(1, STARTUP_MAX_ATTEMPTS + 1):
+        try:
+            await step()
+            readiness["timings"][phase] = round(time.perf_counter() - phase_started, 3)
+            return True
+        except Exception as exc:
+            readiness["error"] = str(exc)
+            if attempt == STARTUP_MAX_ATTEMPTS:
+                logger.exception("Startup failed during %s after %d attempts", phase, attempt)
+                return False
+            logger.warning("Startup phase %s failed (attempt %d), retrying: %s", phase, attempt, exc)
+            await asyncio.sleep(min(STARTUP_RETRY_SECONDS * 2 ** (attempt - 1), STARTUP_MAX_BACKOFF_SECONDS))
+
+async def warm_up():
+    started = time.perf_counter()
+    for phase, step in (("mongo", wait_for_mongo), ("indexes", create_indexes), ("caches", warm_caches)):
+        if not await run_startup_phase(phase, step):
+            # /healthz now fails too, so the orchestrator restarts the worker
+            readiness["phase"] = "failed"
+            return
+    start_background_loops()
+    readiness.update(ready=True, phase="ready", error=None)
+    logger.info("Ready in %.2fs %s", time.perf_counter() - started, readiness["timings"])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WEB_CONCURRENCY > 1 and not CACHE_URL:
+        logger.warning(
+            "Running %d workers without CACHE_URL: caches are per worker and kept for at most %ss",
+            WEB_CONCURRENCY, CACHE_LOCAL_TTL_SECONDS
+        )
+    await cache.start()
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+    await cache.close()
+    for task in background_tasks:
+        task.cancel()
+    if _job_executor["executor"] is not None:
+        _job_executor["executor"].shutdown(wait=False, cancel_futures=True)
+    client.close()
+
+# Create the main app
+app = FastAPI(lifespan=lifespan)
 app.include_router(api_router)
 
 app.add_middleware(
@@ -427,12 +2563,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+# Probes for the load balancer, outside /api and unauthenticated
+@app.get("/healthz")
+async def healthz():
+    if readiness["phase"] == "failed":
+        return JSONResponse(status_code=503, content={"status": "failed", "error": readiness["error"]})
+    return {"status": "ok"}
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+@app.get("/readyz")
+async def readyz():
+    if not readiness["ready"]:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "starting", "phase": readiness["phase"], "error": readiness["error"]}
+        )
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), READINESS_PING_TIMEOUT_SECONDS)
+    except (asyncio.TimeoutError, PyMongoError) as exc:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "phase": "ready", "error": str(exc) or "MongoDB ping timed out"}
+        )
+    return {"status": "ready", "timings": readiness["timings"]}
@@ -1,6 +1,7 @@
 import requests
 import sys
 import json
+import time
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 
@@ -354,6 +355,96 @@ class MotherHomesPGTester:
             self.log_test("Monthly Date Filter", False, "- Monthly filtering failed")
             return False
 
+    def test_recurring_expenses(self):
+        """Test recurring expense templates and backfill"""
+        print("\n🔍 Testing Recurring Expenses...")
+        
+        if not self.created_flats:
+            self.log_test("Recurring Expenses", False, "- No flats available")
+            return False
+        
+        flat_id = self.created_flats[1]['id']
+        start_date = (datetime.now() - timedelta(days=67)).isoformat()
+        template_data = {"category": "maid", "description": "Weekly Maid", "amount": 700, "flat_id": flat_id, "cadence": "weekly", "start_date": start_date}
+        
+        success, response = self.make_request('POST', 'recurring-expenses', template_data, 200)
+        if not success or 'next_date' not in response:
+            self.log_test("Create Recurring Expense", False, "- Creation failed")
+            return False
+        template_id = response['id']
+        self.log_test("Create Recurring Expense", True, f"- Next occurrence: {response['next_date']}")
+        
+        # Start date plus nine missed weeks are backfilled on creation
+        success, response = self.make_request('GET', 'expenses', {'flat_id': flat_id})
+        backfilled = [exp for exp in response if exp['description'] == 'Weekly Maid'] if success else []
+        if len(backfilled) != 10:
+            self.log_test("Recurring Backfill", False, f"- Expected 10 occurrences, got {len(backfilled)}")
+            return False
+        self.log_test("Recurring Backfill", True, f"- {len(backfilled)} occurrences")
+        
+        # Remove the template and its occurrences so later totals are unaffected
+        success, _ = self.make_request('DELETE', f'recurring-expenses/{template_id}', expected_status=200)
+        for expense in backfilled:
+            self.make_request('DELETE', f"expenses/{expense['id']}", expected_status=200)
+        self.log_test("Delete Recurring Expense", success)
+        return success
+
+    def test_expense_search(self):
+        """Test full-text search and description autocomplete"""
+        print("\n🔍 Testing Expense Search...")
+        
+        success, response = self.make_request('GET', 'expenses/search', {'q': 'cleaning'})
+        
+        if success and 'results' in response:
+            # "Cleaning Service" x2 and "Cleaning Supplies" match on description
+            if response['total'] >= 3 and all('score' in hit for hit in response['results']):
+                self.log_test("Expense Search", True, f"- {response['total']} matches for 'cleaning'")
+            else:
+                self.log_test("Expense Search", False, f"- Expected at least 3 ranked matches, got {response['total']}")
+                return False
+        else:
+            self.log_test("Expense Search", False, "- Search failed")
+            return False
+        
+        success, response = self.make_request('GET', 'expenses/autocomplete', {'prefix': 'clean'})
+        
+        if success and isinstance(response, list) and response and response[0] == 'Cleaning Service':
+            self.log_test("Description Autocomplete", True, f"- Suggestions: {response}")
+            return True
+        else:
+            self.log_test("Description Autocomplete", False, f"- Unexpected suggestions: {response}")
+            return False
+
+    def test_incremental_sync(self):
+        """Test incremental sync tokens and tombstones"""
+        print("\n🔍 Testing Incremental Sync...")
+        
+        flat_id = self.created_flats[0]['id']
+        success, response = self.make_request('GET', 'sync', {'flat_id': flat_id})
+        if not success or len(response.get('flats', [])) != 1:
+            self.log_test("Full Sync", False, "- Failed to retrieve flat snapshot")
+            return False
+        token = response['token']
+        self.log_test("Full Sync", True, f"- {len(response['tenants'])} tenants, {len(response['expenses'])} expenses")
+        
+        # Add then delete an expense; only that change should come back
+        expense_data = {"category": "other", "description": "Sync Check", "amount": 1, "flat_id": flat_id}
+        success, expense = self.make_request('POST', 'expenses', expense_data, 200)
+        success, response = self.make_request('GET', 'sync', {'flat_id': flat_id, 'since': token})
+        if not success or [exp['id'] for exp in response['expenses']] != [expense['id']]:
+            self.log_test("Incremental Sync", False, "- Expected only the new expense")
+            return False
+        token = response['token']
+        
+        self.make_request('DELETE', f"expenses/{expense['id']}", expected_status=200)
+        success, response = self.make_request('GET', 'sync', {'flat_id': flat_id, 'since': token})
+        if not success or [item['id'] for item in response['deleted']] != [expense['id']]:
+            self.log_test("Sync Tombstones", False, "- Expected a tombstone for the deleted expense")
+            return False
+        
+        self.log_test("Incremental Sync", True, "- Changes and tombstones returned since token")
+        return True
+
     def test_dashboard_analytics(self):
         """Test dashboard endpoint and calculations"""
         print("\n🔍 Testing Dashboard Analytics...")
@@ -419,6 +510,138 @@ class MotherHomesPGTester:
             self.log_test("Dashboard Date Filter", False, "- Date filtering failed")
             return False
 
+    def test_period_comparison(self):
+        """Test period-over-period comparison endpoint"""
+        print("\n🔍 Testing Period Comparison...")
+        
+        for period in ['month', 'quarter', 'year']:
+            success, response = self.make_request('GET', 'analytics/compare', {'period': period})
+            
+            if not success or 'flats_comparison' not in response:
+                self.log_test(f"Compare {period}", False, "- Failed to retrieve comparison")
+                return False
+            
+            expected_change = response['current']['total_expenses'] - response['previous']['total_expenses']
+            if abs(response['expenses_change'] - expected_change) >= 0.01:
+                self.log_test(f"Compare {period}", False, f"- Expected change: ₹{expected_change}, Got: ₹{response['expenses_change']}")
+                return False
+            
+            self.log_test(f"Compare {period}", True, f"- Current: ₹{response['current']['total_expenses']}, Previous: ₹{response['previous']['total_expenses']}")
+        
+        # Invalid period should be rejected
+        success, _ = self.make_request('GET', 'analytics/compare', {'period': 'week'}, 400)
+        self.log_test("Compare Invalid Period", success, "- Rejected with 400" if success else "")
+        return success
+
+    def test_profit_forecast(self):
+        """Test per-flat profit forecasting"""
+        print("\n🔍 Testing Profit Forecast...")
+        
+        success, response = self.make_request('GET', 'analytics/forecast', {'months': 3})
+        
+        if not success or 'flats_forecast' not in response:
+            self.log_test("Profit Forecast", False, "- Failed to retrieve forecast")
+            return False
+        
+        if len(response['projections']) != 3 or any(len(ff['projections']) != 3 for ff in response['flats_forecast']):
+            self.log_test("Profit Forecast", False, "- Expected 3 projected months per flat")
+            return False
+        
+        for projection in response['projections']:
+            expected_profit = projection['projected_income'] - projection['projected_expenses']
+            if abs(projection['projected_profit'] - expected_profit) >= 0.01:
+                self.log_test("Forecast Profit", False, f"- {projection['month']}: expected ₹{expected_profit}, got ₹{projection['projected_profit']}")
+                return False
+        
+        self.log_test("Profit Forecast", True, f"- {len(response['flats_forecast'])} flats, data version {response['data_version']}")
+        return True
+
+    def test_expense_anomalies(self):
+        """Test expense anomaly detection"""
+        print("\n🔍 Testing Expense Anomalies...")
+        
+        success, response = self.make_request('GET', 'analytics/anomalies', {'live': 'true'})
+        
+        if not success or 'anomalies' not in response:
+            self.log_test("Expense Anomalies", False, "- Failed to retrieve anomalies")
+            return False
+        
+        for anomaly in response['anomalies']:
+            if not anomaly['reasons'] or anomaly['expense']['id'] not in [exp['id'] for exp in self.created_expenses]:
+                self.log_test("Expense Anomalies", False, f"- Unexpected anomaly: {anomaly}")
+                return False
+        
+        self.log_test("Expense Anomalies", True, f"- {len(response['anomalies'])} flagged at threshold {response['threshold']}")
+        return True
+
+    def test_admin_analytics_access(self):
+        """Test admin analytics endpoints reject regular users"""
+        print("\n🔍 Testing Admin Analytics Access...")
+        
+        for endpoint in ['admin/analytics/owners', 'admin/analytics/top-flats', 'admin/analytics/categories', 'admin/metrics/pool']:
+            success, _ = self.make_request('GET', endpoint, expected_status=403)
+            if not success:
+                self.log_test(f"Admin Only {endpoint}", False, "- Regular user was not rejected")
+                return False
+        
+        self.log_test("Admin Analytics Access", True, "- Regular user rejected with 403")
+        return True
+
+    def test_background_jobs(self):
+        """Test queuing a dashboard job and downloading its result"""
+        print("\n🔍 Testing Background Jobs...")
+        
+        success, job = self.make_request('POST', 'jobs', {"type": "dashboard"}, 200)
+        if not success or job.get('status') != 'queued':
+            self.log_test("Create Job", False, "- Job was not queued")
+            return False
+        self.log_test("Create Job", True, f"- Job ID: {job['id']}")
+        
+        for _ in range(30):
+            success, job = self.make_request('GET', f"jobs/{job['id']}")
+            if not success or job['status'] in ('succeeded', 'failed'):
+                break
+            time.sleep(1)
+        
+        if not success or job['status'] != 'succeeded':
+            self.log_test("Job Completion", False, f"- Status: {job.get('status')}, Error: {job.get('error')}")
+            return False
+        
+        success, result = self.make_request('GET', f"jobs/{job['id']}/result")
+        success_dashboard, dashboard = self.make_request('GET', 'dashboard')
+        if success and success_dashboard and abs(result['total_expenses'] - dashboard['total_expenses']) < 0.01:
+            self.log_test("Job Result", True, f"- Total Expenses: ₹{result['total_expenses']}")
+            return True
+        else:
+            self.log_test("Job Result", False, "- Result does not match the dashboard")
+            return False
+
+    def test_columnar_export(self):
+        """Test Parquet and Arrow IPC expense exports"""
+        print("\n🔍 Testing Columnar Export...")
+        
+        headers = {'Authorization': f'Bearer {self.token}'}
+        
+        try:
+            response = requests.get(f"{self.base_url}/api/export/expenses.parquet", headers=headers)
+            # Parquet files start and end with the PAR1 magic bytes
+            if response.status_code == 200 and response.content[:4] == b'PAR1' and response.content[-4:] == b'PAR1':
+                self.log_test("Parquet Export", True, f"- {len(response.content)} bytes")
+            else:
+                self.log_test("Parquet Export", False, f"- Status: {response.status_code}")
+                return False
+            
+            response = requests.get(f"{self.base_url}/api/export/expenses.arrow", headers=headers)
+            if response.status_code == 200 and response.headers.get('content-type') == 'application/vnd.apache.arrow.stream':
+                self.log_test("Arrow Export", True, f"- {len(response.content)} bytes")
+                return True
+            else:
+                self.log_test("Arrow Export", False, f"- Status: {response.status_code}")
+                return False
+        except Exception as e:
+            self.log_test("Columnar Export", False, f"- Exception: {str(e)}")
+            return False
+
     def run_all_tests(self):
         """Run comprehensive test suite"""
         print("🚀 Starting Mother Homes PG Management API Tests")
@@ -476,6 +699,18 @@ class MotherHomesPGTester:
             print("❌ Date filtering failed")
             return False
         
+        if not self.test_recurring_expenses():
+            print("❌ Recurring expenses failed")
+            return False
+        
+        if not self.test_expense_search():
+            print("❌ Expense search failed")
+            return False
+        
+        if not self.test_incremental_sync():
+            print("❌ Incremental sync failed")
+            return False
+        
         # Dashboard Analytics Tests
         if not self.test_dashboard_analytics():
             print("❌ Dashboard analytics failed")
@@ -485,6 +720,30 @@ class MotherHomesPGTester:
             print("❌ Dashboard filtering failed")
             return False
         
+        if not self.test_period_comparison():
+            print("❌ Period comparison failed")
+            return False
+        
+        if not self.test_profit_forecast():
+            print("❌ Profit forecast failed")
+            return False
+        
+        if not self.test_expense_anomalies():
+            print("❌ Expense anomalies failed")
+            return False
+        
+        if not self.test_admin_analytics_access():
+            print("❌ Admin analytics access failed")
+            return False
+        
+        if not self.test_background_jobs():
+            print("❌ Background jobs failed")
+            return False
+        
+        if not self.test_columnar_export():
+            print("❌ Columnar export failed")
+            return False
+        
         return True
 
     def print_summary(self):
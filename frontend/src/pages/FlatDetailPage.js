@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { toast } from 'sonner';
 import api from '@/utils/api';
@@ -32,6 +32,14 @@ const EXPENSE_CATEGORIES = [
   'other',
 ];
 
+// Upserts changed records into a list and drops deleted ones, keeping order
+const applyChanges = (items, changed, deletedIds) => {
+  const byId = new Map(items.map((item) => [item.id, item]));
+  changed.forEach((item) => byId.set(item.id, item));
+  deletedIds.forEach((id) => byId.delete(id));
+  return Array.from(byId.values());
+};
+
 const FlatDetailPage = () => {
   const { flatId } = useParams();
   const navigate = useNavigate();
@@ -50,21 +58,45 @@ const FlatDetailPage = () => {
     amount: '',
     date: new Date().toISOString().split('T')[0],
   });
+  const [descriptionSuggestions, setDescriptionSuggestions] = useState([]);
+  const syncToken = useRef(null);
 
   useEffect(() => {
+    syncToken.current = null;
     fetchData();
   }, [flatId]);
 
+  useEffect(() => {
+    if (!expenseDialogOpen) return;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await api.get('/expenses/autocomplete', {
+          params: { prefix: expenseForm.description },
+        });
+        setDescriptionSuggestions(response.data);
+      } catch (error) {
+        setDescriptionSuggestions([]);
+      }
+    }, 200);
+    return () => clearTimeout(timer);
+  }, [expenseDialogOpen, expenseForm.description]);
+
+  // Only changes since the last sync are transferred after the first load
   const fetchData = async () => {
     try {
-      const [flatRes, tenantsRes, expensesRes] = await Promise.all([
-        api.get(`/flats/${flatId}`),
-        api.get(`/tenants?flat_id=${flatId}`),
-        api.get(`/expenses?flat_id=${flatId}`),
-      ]);
-      setFlat(flatRes.data);
-      setTenants(tenantsRes.data);
-      setExpenses(expensesRes.data);
+      const isFullSync = syncToken.current === null;
+      const response = await api.get('/sync', {
+        params: isFullSync ? { flat_id: flatId } : { flat_id: flatId, since: syncToken.current },
+      });
+      const { token, flats, tenants: changedTenants, expenses: changedExpenses, deleted } = response.data;
+      const deletedIds = (kind) => deleted.filter((item) => item.kind === kind).map((item) => item.id);
+      if ((isFullSync && flats.length === 0) || deletedIds('flat').includes(flatId)) {
+        throw new Error('Flat not found');
+      }
+      if (flats.length > 0) setFlat(flats[0]);
+      setTenants((current) => applyChanges(isFullSync ? [] : current, changedTenants, deletedIds('tenant')));
+      setExpenses((current) => applyChanges(isFullSync ? [] : current, changedExpenses, deletedIds('expense')));
+      syncToken.current = token;
     } catch (error) {
       toast.error('Failed to load flat details');
       navigate('/flats');
@@ -443,9 +475,16 @@ const FlatDetailPage = () => {
                   value={expenseForm.description}
                   onChange={(e) => setExpenseForm({ ...expenseForm, description: e.target.value })}
                   required
+                  list="expense-description-suggestions"
+                  autoComplete="off"
                   data-testid="expense-description-input"
                   className="mt-1"
                 />
+                <datalist id="expense-description-suggestions">
+                  {descriptionSuggestions.map((suggestion) => (
+                    <option key={suggestion} value={suggestion} />
+                  ))}
+                </datalist>
               </div>
               <div>
                 <Label htmlFor="expense-amount">Amount</Label>
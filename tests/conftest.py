@@ -0,0 +1,38 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    """A scratch database on MONGO_URL, patched in as server.db and its read-routed views.
+
+    Tests using it are skipped when no MongoDB server is reachable.
+    """
+    admin = MongoClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=1000)
+    try:
+        admin.admin.command("ping")
+    except PyMongoError:
+        admin.close()
+        pytest.skip("MongoDB is not reachable at MONGO_URL")
+
+    name = f"test_{uuid.uuid4().hex[:12]}"
+    database = server.AsyncIOMotorClient(os.environ["MONGO_URL"])[name]
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "analytics_db", database)
+    monkeypatch.setattr(server, "portfolio_db", database)
+    monkeypatch.setattr(server, "cache", server.MemoryCache())
+    monkeypatch.setitem(server._archive_boundary, "expires_at", 0.0)
+    yield database
+    admin.drop_database(name)
+    admin.close()
+    database.client.close()
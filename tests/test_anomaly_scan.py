@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+
+async def seed(db, user_id="owner", flat_id="flat"):
+    amounts = [100.0, 102.0, 98.0, 101.0, 99.0, 100.0, 5000.0]
+    await db.expenses.insert_many([
+        {"id": f"e{i}", "user_id": user_id, "flat_id": flat_id, "category": "maid",
+         "description": f"Maid {i}", "amount": amount,
+         "date": (datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(days=30 * i)).isoformat()}
+        for i, amount in enumerate(amounts)
+    ])
+
+
+def test_scan_lease_is_exclusive_until_parked(mongo_db):
+    async def scenario():
+        first, second = await asyncio.gather(
+            server.acquire_lease(server.ANOMALY_SCAN_LEASE),
+            server.acquire_lease(server.ANOMALY_SCAN_LEASE),
+        )
+        assert (first is None) != (second is None)
+        token = first or second
+
+        await server.park_lease(server.ANOMALY_SCAN_LEASE, token, datetime.now(timezone.utc) + timedelta(hours=1))
+        assert await server.acquire_lease(server.ANOMALY_SCAN_LEASE) is None
+
+        await server.park_lease(server.ANOMALY_SCAN_LEASE, token, datetime.now(timezone.utc) - timedelta(seconds=1))
+        assert await server.acquire_lease(server.ANOMALY_SCAN_LEASE) is not None
+
+    asyncio.run(scenario())
+
+
+def test_scan_replaces_only_the_previous_scan(mongo_db):
+    async def scenario():
+        await seed(mongo_db)
+        assert await server.scan_expense_anomalies() > 0
+        first = await mongo_db.anomaly_scans.find_one({"_id": "latest"})
+
+        # Rows another scanner is still inserting must survive this scan
+        await mongo_db.expense_anomalies.insert_one({"scan_id": "in-flight", "user_id": "owner"})
+        flagged = await server.scan_expense_anomalies()
+        latest = await mongo_db.anomaly_scans.find_one({"_id": "latest"})
+
+        assert latest["scan_id"] != first["scan_id"]
+        assert await mongo_db.expense_anomalies.count_documents({"scan_id": first["scan_id"]}) == 0
+        assert await mongo_db.expense_anomalies.count_documents({"scan_id": latest["scan_id"]}) == flagged
+        assert await mongo_db.expense_anomalies.count_documents({"scan_id": "in-flight"}) == 1
+
+    asyncio.run(scenario())
+
+
+def test_work_is_cancelled_when_the_lease_is_taken_over(mongo_db, monkeypatch):
+    monkeypatch.setattr(server, "JOB_LEASE_SECONDS", 0.3)
+
+    async def scenario():
+        token = await server.acquire_lease(server.ANOMALY_SCAN_LEASE)
+        await mongo_db.leases.update_one({"_id": server.ANOMALY_SCAN_LEASE}, {"$set": {"lease_owner": "someone-else"}})
+        with pytest.raises(server.LeaseLost):
+            await asyncio.wait_for(
+                server.run_under_lease(mongo_db.leases, {"_id": server.ANOMALY_SCAN_LEASE}, token, asyncio.sleep(5)),
+                timeout=2
+            )
+
+    asyncio.run(scenario())
@@ -0,0 +1,147 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+OLD_AMOUNTS = [10.0, 20.0, 30.0, 40.0, 50.0]
+RECENT_AMOUNTS = [5.0, 7.0]
+
+
+async def seed(db, user):
+    now = datetime.now(timezone.utc)
+    await db.users.insert_one({**user.model_dump(mode="json"), "data_version": 0})
+    flat = server.Flat(name="Flat 1", address="Street 1", rent_amount=1000, user_id=user.id)
+    await db.flats.insert_one(flat.model_dump(mode="json"))
+    dates = [now - timedelta(days=700 + i) for i in range(len(OLD_AMOUNTS))]
+    dates += [now - timedelta(days=i) for i in range(len(RECENT_AMOUNTS))]
+    expenses = [
+        server.Expense(category="repairs", description=f"Expense {i}", amount=amount,
+                       flat_id=flat.id, user_id=user.id, date=date)
+        for i, (amount, date) in enumerate(zip(OLD_AMOUNTS + RECENT_AMOUNTS, dates))
+    ]
+    await db.expenses.insert_many([
+        {**expense.model_dump(), "date": expense.date.isoformat()} for expense in expenses
+    ])
+    return flat
+
+
+async def summary_total(db, user):
+    rows = await db.expense_archive_summary.find({"user_id": user.id}).to_list(None)
+    return sum(row["total_amount"] for row in rows)
+
+
+@pytest.fixture
+def fast_archival(monkeypatch):
+    monkeypatch.setattr(server, "ARCHIVE_BOUNDARY_REFRESH_SECONDS", 0)
+    monkeypatch.setattr(server, "EXPENSE_ARCHIVE_BATCH_SIZE", 2)
+
+
+def test_archival_moves_old_expenses_and_reads_span_both_tiers(mongo_db, fast_archival):
+    async def scenario():
+        user = server.User(email="owner@example.com", name="Owner")
+        flat = await seed(mongo_db, user)
+
+        assert await server.archive_old_expenses(365) == len(OLD_AMOUNTS)
+        assert await mongo_db.expenses.count_documents({}) == len(RECENT_AMOUNTS)
+        assert await mongo_db.expenses_archive.count_documents({}) == len(OLD_AMOUNTS)
+        assert await summary_total(mongo_db, user) == sum(OLD_AMOUNTS)
+
+        dashboard = await server.get_dashboard(current_user=user)
+        assert dashboard.total_expenses == sum(OLD_AMOUNTS) + sum(RECENT_AMOUNTS)
+
+        start = (datetime.now(timezone.utc) - timedelta(days=800)).isoformat()
+        dashboard = await server.get_dashboard(start_date=start, end_date=None, current_user=user)
+        assert dashboard.total_expenses == sum(OLD_AMOUNTS) + sum(RECENT_AMOUNTS)
+
+        expenses = await server.get_expenses(flat_id=flat.id, current_user=user)
+        assert sorted(e["amount"] for e in expenses) == sorted(OLD_AMOUNTS + RECENT_AMOUNTS)
+
+    asyncio.run(scenario())
+
+
+def test_archival_interrupted_mid_run_keeps_totals_and_resumes(mongo_db, fast_archival, monkeypatch):
+    async def scenario():
+        user = server.User(email="owner@example.com", name="Owner")
+        await seed(mongo_db, user)
+
+        rebuild = server.rebuild_archive_summary
+        calls = []
+
+        async def crash_on_second_batch(user_ids):
+            calls.append(user_ids)
+            if len(calls) == 2:
+                raise RuntimeError("worker died")
+            await rebuild(user_ids)
+
+        monkeypatch.setattr(server, "rebuild_archive_summary", crash_on_second_batch)
+        with pytest.raises(RuntimeError):
+            await server.archive_old_expenses(365)
+
+        # Whatever left the hot tier is already summarized
+        hot = await mongo_db.expenses.find({}).to_list(None)
+        assert sum(e["amount"] for e in hot) + await summary_total(mongo_db, user) == sum(OLD_AMOUNTS + RECENT_AMOUNTS)
+
+        monkeypatch.setattr(server, "rebuild_archive_summary", rebuild)
+        await server.archive_old_expenses(365)
+        assert await mongo_db.expenses.count_documents({}) == len(RECENT_AMOUNTS)
+        assert await summary_total(mongo_db, user) == sum(OLD_AMOUNTS)
+
+    asyncio.run(scenario())
+
+
+def test_rows_edited_or_deleted_while_being_copied_are_not_lost_or_resurrected(mongo_db, fast_archival, monkeypatch):
+    async def scenario():
+        user = server.User(email="owner@example.com", name="Owner")
+        await seed(mongo_db, user)
+        edited, deleted = await mongo_db.expenses.find({"amount": {"$in": OLD_AMOUNTS[:2]}}).to_list(None)
+
+        rebuild = server.rebuild_archive_summary
+        calls = []
+
+        async def race_on_first_batch(user_ids):
+            calls.append(user_ids)
+            if len(calls) == 1:
+                # Lands between the copy into the archive and the hot delete
+                await mongo_db.expenses.update_one({"id": edited["id"]}, {"$set": {"amount": 11.0, "sync_seq": 99}})
+                await mongo_db.expenses.delete_one({"id": deleted["id"]})
+            await rebuild(user_ids)
+
+        monkeypatch.setattr(server, "rebuild_archive_summary", race_on_first_batch)
+        await server.archive_old_expenses(365)
+
+        assert (await mongo_db.expenses_archive.find_one({"id": edited["id"]}))["amount"] == 11.0
+        assert await mongo_db.expenses_archive.find_one({"id": deleted["id"]}) is None
+        assert await mongo_db.expenses.count_documents({}) == len(RECENT_AMOUNTS)
+        expected = sum(OLD_AMOUNTS) - edited["amount"] + 11.0 - deleted["amount"]
+        assert await summary_total(mongo_db, user) == expected
+
+    asyncio.run(scenario())
+
+
+def test_rows_summarized_but_not_yet_deleted_are_counted_once(mongo_db, fast_archival, monkeypatch):
+    async def scenario():
+        user = server.User(email="owner@example.com", name="Owner")
+        await seed(mongo_db, user)
+
+        rebuild = server.rebuild_archive_summary
+
+        async def crash_after_rebuild(user_ids):
+            await rebuild(user_ids)
+            raise RuntimeError("worker died")
+
+        monkeypatch.setattr(server, "rebuild_archive_summary", crash_after_rebuild)
+        with pytest.raises(RuntimeError):
+            await server.archive_old_expenses(365)
+        # The first batch is now in the hot tier, the archive and the summary
+        assert await mongo_db.expenses.count_documents({}) == len(OLD_AMOUNTS + RECENT_AMOUNTS)
+        assert await summary_total(mongo_db, user) > 0
+
+        dashboard = await server.get_dashboard(current_user=user)
+        assert dashboard.total_expenses == sum(OLD_AMOUNTS) + sum(RECENT_AMOUNTS)
+        start = (datetime.now(timezone.utc) - timedelta(days=800)).isoformat()
+        dashboard = await server.get_dashboard(start_date=start, end_date=None, current_user=user)
+        assert dashboard.total_expenses == sum(OLD_AMOUNTS) + sum(RECENT_AMOUNTS)
+
+    asyncio.run(scenario())
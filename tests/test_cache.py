@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+import server
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+async def wait_for(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not await predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+def test_memory_cache_expires_and_invalidates():
+    async def scenario():
+        cache = server.MemoryCache()
+        await cache.set("user:1", "profile", {"name": "A"}, 60)
+        await cache.set("user:1", "stale", True, -1)
+        await cache.set("user:2", "profile", {"name": "B"}, 60)
+        assert await cache.get("user:1", "profile") == {"name": "A"}
+        assert await cache.get("user:1", "stale") is None
+
+        await cache.invalidate("user:1")
+        assert await cache.get("user:1", "profile") is None
+        assert await cache.get("user:2", "profile") == {"name": "B"}
+
+    asyncio.run(scenario())
+
+
+def test_memory_cache_drops_expired_entries(monkeypatch):
+    monkeypatch.setattr(server.MemoryCache, "SWEEP_SECONDS", 0)
+
+    async def scenario():
+        cache = server.MemoryCache()
+        await cache.set("user:1", "dashboard:0::", {"total_flats": 1}, -1)
+        assert await cache.get("user:1", "dashboard:0::") is None
+        assert "user:1" not in cache.entries
+
+        # Entries nobody reads again are swept on a later write
+        await cache.set("user:2", "dashboard:0::", {"total_flats": 1}, -1)
+        await cache.set("user:3", "profile", {"name": "C"}, 60)
+        assert list(cache.entries) == ["user:3"]
+
+    asyncio.run(scenario())
+
+
+def test_memory_cache_shortens_ttls_when_workers_cannot_invalidate_each_other(monkeypatch):
+    monkeypatch.setattr(server, "CACHE_URL", "")
+    monkeypatch.setattr(server, "WEB_CONCURRENCY", 4)
+    monkeypatch.setattr(server, "CACHE_LOCAL_TTL_SECONDS", 0)
+
+    async def scenario():
+        cache = server.create_cache()
+        await cache.set("user:1", "profile", {"name": "A"}, 60)
+        assert await cache.get("user:1", "profile") is None
+
+    asyncio.run(scenario())
+
+
+def test_redis_cache_is_shared_and_invalidated_across_workers():
+    async def scenario():
+        redis_server = fakeredis.FakeServer()
+        workers = [
+            server.RedisCache(fakeredis.aioredis.FakeRedis(server=redis_server, decode_responses=True), local_ttl=60)
+            for _ in range(2)
+        ]
+        for worker in workers:
+            await worker.start()
+        first, second = workers
+        try:
+            await first.set("user:1", "dashboard:0::", {"total_flats": 2}, 60)
+            assert await second.get("user:1", "dashboard:0::") == {"total_flats": 2}
+            assert await second.local.get("user:1", "dashboard:0::") == {"total_flats": 2}
+
+            # Wait for the listener to subscribe before publishing
+            assert await wait_for(lambda: _subscribed(redis_server))
+            await first.invalidate("user:1")
+            assert await wait_for(lambda: _evicted(second, "user:1", "dashboard:0::"))
+            assert await second.get("user:1", "dashboard:0::") is None
+        finally:
+            for worker in workers:
+                await worker.close()
+
+    asyncio.run(scenario())
+
+
+def test_redis_cache_treats_an_unreachable_server_as_a_miss():
+    async def scenario():
+        redis_server = fakeredis.FakeServer()
+        redis_server.connected = False
+        cache = server.RedisCache(fakeredis.aioredis.FakeRedis(server=redis_server, decode_responses=True), local_ttl=0)
+        await cache.set("user:1", "profile", {"name": "A"}, 60)
+        assert await cache.get("user:1", "profile") is None
+        await cache.invalidate("user:1")
+
+    asyncio.run(scenario())
+
+
+async def _subscribed(redis_server):
+    client = fakeredis.aioredis.FakeRedis(server=redis_server)
+    counts = await client.pubsub_numsub(server.CACHE_INVALIDATION_CHANNEL)
+    return counts[0][1] == 2
+
+
+async def _evicted(cache, namespace, key):
+    return await cache.local.get(namespace, key) is None
+
+
+def test_dashboard_computed_across_a_write_is_not_served_after_it(mongo_db, monkeypatch):
+    async def scenario():
+        user = server.User(email="owner@example.com", name="Owner")
+        await mongo_db.users.insert_one({**user.model_dump(mode="json"), "data_version": 0})
+        flat = server.Flat(name="Flat 1", address="Street 1", rent_amount=1000, user_id=user.id)
+        await mongo_db.flats.insert_one(flat.model_dump(mode="json"))
+        expense = server.Expense(category="repairs", description="Pipe", amount=40, flat_id=flat.id, user_id=user.id)
+
+        drop_archived_copies = server.drop_archived_copies
+
+        async def write_mid_dashboard(expenses):
+            # The write and its invalidation land before the stale result is cached
+            await mongo_db.expenses.insert_one({**expense.model_dump(), "date": expense.date.isoformat()})
+            await server.bump_data_version(user.id)
+            return await drop_archived_copies(expenses)
+
+        monkeypatch.setattr(server, "drop_archived_copies", write_mid_dashboard)
+        assert (await server.get_dashboard(current_user=user)).total_expenses == 0
+        monkeypatch.setattr(server, "drop_archived_copies", drop_archived_copies)
+        assert (await server.get_dashboard(current_user=user)).total_expenses == 40
+
+    asyncio.run(scenario())
@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import AutoReconnect
+
+import server
+
+
+async def queue_job(db, job_type="slow"):
+    user = server.User(email="owner@example.com", name="Owner")
+    await db.users.insert_one(user.model_dump(mode="json"))
+    job = server.Job(user_id=user.id, type=job_type)
+    await db.jobs.insert_one(job.model_dump(mode="json"))
+    return job
+
+
+async def expire_lease(db, job_id):
+    past = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+    await db.jobs.update_one({"id": job_id}, {"$set": {"lease_expires_at": past}})
+
+
+def test_reclaimed_job_gets_a_new_lease_token(mongo_db):
+    async def scenario():
+        job = await queue_job(mongo_db)
+        first = await server.claim_job()
+        await expire_lease(mongo_db, job.id)
+        second = await server.claim_job()
+        assert first["lease_owner"] != second["lease_owner"]
+
+        # The stale claim, though in the same process, can no longer write
+        await server.set_job_progress(first, 0.5)
+        assert (await mongo_db.jobs.find_one({"id": job.id}))["progress"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_job_is_cancelled_and_not_recorded_once_its_lease_is_lost(mongo_db, monkeypatch):
+    monkeypatch.setattr(server, "JOB_LEASE_SECONDS", 0.3)
+    cancelled = asyncio.Event()
+
+    async def slow_job(job, user):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return {}, None
+
+    monkeypatch.setitem(server.JOB_HANDLERS, "slow", slow_job)
+
+    async def scenario():
+        job = await queue_job(mongo_db)
+        claimed = await server.claim_job()
+        running = asyncio.create_task(server.run_job(claimed))
+        await mongo_db.jobs.update_one({"id": job.id}, {"$set": {"lease_owner": "another-claim"}})
+        await asyncio.wait_for(running, timeout=2)
+
+        assert cancelled.is_set()
+        stored = await mongo_db.jobs.find_one({"id": job.id})
+        assert stored["status"] == "running"
+        assert stored["lease_owner"] == "another-claim"
+
+    asyncio.run(scenario())
+
+
+def test_lease_renewal_survives_transient_errors(mongo_db, monkeypatch):
+    monkeypatch.setattr(server, "JOB_LEASE_SECONDS", 0.3)
+
+    class FlakyJobs:
+        """Fails the first renewal, then delegates to the real collection."""
+
+        def __init__(self):
+            self.calls = 0
+
+        async def update_one(self, *args, **kwargs):
+            self.calls += 1
+            if self.calls == 1:
+                raise AutoReconnect("primary stepped down")
+            return await mongo_db.jobs.update_one(*args, **kwargs)
+
+    async def scenario():
+        await queue_job(mongo_db)
+        claimed = await server.claim_job()
+        jobs = FlakyJobs()
+        result = await server.run_under_lease(
+            jobs, {"id": claimed["id"]}, claimed["lease_owner"], asyncio.sleep(0.5, result="done")
+        )
+        assert result == "done"
+        assert jobs.calls >= 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+import server
+
+
+def test_warm_up_retries_a_failed_phase_then_starts(monkeypatch):
+    monkeypatch.setattr(server, "STARTUP_RETRY_SECONDS", 0)
+    monkeypatch.setattr(server, "readiness", {"ready": False, "phase": "starting", "error": None, "timings": {}})
+    started = []
+    attempts = []
+
+    async def noop():
+        pass
+
+    async def flaky_indexes():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("primary stepped down")
+
+    async def warm_caches():
+        pass
+
+    monkeypatch.setattr(server, "wait_for_mongo", noop)
+    monkeypatch.setattr(server, "create_indexes", flaky_indexes)
+    monkeypatch.setattr(server, "warm_caches", warm_caches)
+    monkeypatch.setattr(server, "start_background_loops", lambda: started.append(True))
+
+    asyncio.run(server.warm_up())
+    assert len(attempts) == 2
+    assert started == [True]
+    assert asyncio.run(server.healthz()) == {"status": "ok"}
+
+
+def test_healthz_fails_once_startup_gives_up(monkeypatch):
+    monkeypatch.setattr(server, "STARTUP_RETRY_SECONDS", 0)
+    monkeypatch.setattr(server, "STARTUP_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(server, "readiness", {"ready": False, "phase": "starting", "error": None, "timings": {}})
+    started = []
+
+    async def noop():
+        pass
+
+    async def broken_indexes():
+        raise RuntimeError("duplicate key")
+
+    monkeypatch.setattr(server, "wait_for_mongo", noop)
+    monkeypatch.setattr(server, "create_indexes", broken_indexes)
+    monkeypatch.setattr(server, "start_background_loops", lambda: started.append(True))
+
+    asyncio.run(server.warm_up())
+    assert started == []
+    response = asyncio.run(server.healthz())
+    assert response.status_code == 503
+    assert json.loads(response.body)["error"] == "duplicate key"
@@ -0,0 +1,69 @@
+import asyncio
+
+import server
+
+
+async def insert_flat(db, user, name, sync_seq):
+    flat = server.Flat(name=name, address="Street 1", rent_amount=1000, user_id=user.id)
+    await db.flats.insert_one({**flat.model_dump(mode="json"), "sync_seq": sync_seq})
+    return flat
+
+
+def test_write_committing_after_a_later_seq_is_not_skipped(mongo_db):
+    async def scenario():
+        user = server.User(email="owner@example.com", name="Owner")
+        first_write_ready = asyncio.Event()
+        synced = asyncio.Event()
+
+        async def slow_write():
+            # Reserves its seq first but commits last
+            async with server.sync_write() as sync_seq:
+                first_write_ready.set()
+                await synced.wait()
+                return await insert_flat(mongo_db, user, "Slow", sync_seq)
+
+        slow = asyncio.create_task(slow_write())
+        await first_write_ready.wait()
+        async with server.sync_write() as sync_seq:
+            fast_flat = await insert_flat(mongo_db, user, "Fast", sync_seq)
+
+        first = await server.sync_changes(since=None, flat_id=None, current_user=user)
+        assert [flat.id for flat in first.flats] == [fast_flat.id]
+        synced.set()
+        slow_flat = await slow
+
+        second = await server.sync_changes(since=first.token, flat_id=None, current_user=user)
+        assert slow_flat.id in {flat.id for flat in second.flats}
+
+        # Once nothing is in flight the token catches up with the counter
+        third = await server.sync_changes(since=second.token, flat_id=None, current_user=user)
+        assert int(third.token) >= 2
+        assert third.flats == []
+
+    asyncio.run(scenario())
+
+
+def test_rows_added_while_a_flat_is_deleted_get_tombstones(mongo_db, monkeypatch):
+    async def scenario():
+        user = server.User(email="owner@example.com", name="Owner")
+        flat = await insert_flat(mongo_db, user, "Flat", 1)
+        first = server.Tenant(name="First", rent_amount=500, flat_id=flat.id, user_id=user.id)
+        late = server.Tenant(name="Late", rent_amount=500, flat_id=flat.id, user_id=user.id)
+        await mongo_db.tenants.insert_one(first.model_dump(mode="json"))
+
+        write_tombstones = server.write_tombstones
+
+        async def insert_late_tenant(kind, collection, match, sync_seq):
+            await write_tombstones(kind, collection, match, sync_seq)
+            if kind == "tenant" and not await mongo_db.tenants.find_one({"id": late.id}):
+                await mongo_db.tenants.insert_one(late.model_dump(mode="json"))
+
+        monkeypatch.setattr(server, "write_tombstones", insert_late_tenant)
+        await server.delete_flat(flat.id, current_user=user)
+
+        assert await mongo_db.tenants.count_documents({"flat_id": flat.id}) == 0
+        changes = await server.sync_changes(since="0", flat_id=None, current_user=user)
+        assert changes.flats == []
+        assert {(t.kind, t.id) for t in changes.deleted} == {("flat", flat.id), ("tenant", first.id), ("tenant", late.id)}
+
+    asyncio.run(scenario())